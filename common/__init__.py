@@ -0,0 +1,5 @@
+"""
+Modules shared by samples in more than one directory.  Samples put the root
+of the repository on sys.path before importing from here, so they still run
+from within their own directories.
+"""
@@ -0,0 +1,125 @@
+"""
+A sprite group backed by a uniform grid spatial hash.  Each sprite is placed
+in every cell its rect overlaps; collision queries then only need to look at
+the sprites in the cells the query rect overlaps rather than scanning the
+entire group.
+
+Which rect a sprite is bucketed and tested by is decided by get_rect, which
+is the sprite's rect here.  Subclasses override it to collide sprites by some
+other rect; see platforming/spatial.py and
+four_direction_movement/hitbox_group.py.
+
+Sprites that move must be passed to CellHashGroup.relocate after moving.
+They are only re-bucketed if they have crossed into a different set of cells.
+All queries accept an exclude argument; the excluded sprite is never
+reported.
+"""
+
+import operator
+
+import pygame as pg
+
+
+class CellHashGroup(pg.sprite.Group):
+    """A pg.sprite.Group with fast, cell-bucketed collision queries."""
+    cell_size = 128
+    get_rect = staticmethod(operator.attrgetter("rect"))
+
+    def __init__(self, *sprites, **kwargs):
+        """
+        Accepts sprites exactly like a pg.sprite.Group.  The keyword argument
+        cell_size is the width and height in pixels of each grid cell.
+        """
+        self.cell_size = kwargs.pop("cell_size", self.cell_size)
+        self.cells = {}
+        self.spans = {}
+        self.order = {}
+        self.added = 0
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def get_span(self, rect):
+        """Return the (left, top, right, bottom) range of cells rect covers."""
+        size = self.cell_size
+        return (rect.left//size, rect.top//size,
+                (max(rect.right, rect.left+1)-1)//size,
+                (max(rect.bottom, rect.top+1)-1)//size)
+
+    def bucket(self, sprite, span):
+        """Add sprite to every cell in span."""
+        for i in range(span[0], span[2]+1):
+            for j in range(span[1], span[3]+1):
+                self.cells.setdefault((i,j), set()).add(sprite)
+        self.spans[sprite] = span
+
+    def unbucket(self, sprite):
+        """Remove sprite from every cell it was last placed in."""
+        span = self.spans.pop(sprite)
+        for i in range(span[0], span[2]+1):
+            for j in range(span[1], span[3]+1):
+                cell = self.cells[i,j]
+                cell.discard(sprite)
+                if not cell:
+                    del self.cells[i,j]
+
+    def add_internal(self, sprite, *args):
+        """Register a new sprite with the group and the spatial hash."""
+        pg.sprite.Group.add_internal(self, sprite, *args)
+        self.order[sprite] = self.added
+        self.added += 1
+        self.bucket(sprite, self.get_span(self.get_rect(sprite)))
+
+    def remove_internal(self, sprite):
+        """Remove a sprite from the group and the spatial hash."""
+        pg.sprite.Group.remove_internal(self, sprite)
+        del self.order[sprite]
+        self.unbucket(sprite)
+
+    def copy(self):
+        """Return a new group of the same class, sprites and cell size."""
+        return self.__class__(self.sprites(), cell_size=self.cell_size)
+
+    def relocate(self, sprite):
+        """
+        Call after a sprite in the group has moved.  The sprite is only
+        re-bucketed if its rect now covers a different set of cells.
+        """
+        span = self.get_span(self.get_rect(sprite))
+        if span != self.spans[sprite]:
+            self.unbucket(sprite)
+            self.bucket(sprite, span)
+
+    def query(self, rect, exclude=None):
+        """
+        Return a list of all sprites (other than exclude) whose rects collide
+        with rect.  Sprites are returned in the order they were added to the
+        group, matching the order a plain pg.sprite.Group would give.
+        """
+        span = self.get_span(rect)
+        cells = self.cells
+        found = set()
+        for i in range(span[0], span[2]+1):
+            for j in range(span[1], span[3]+1):
+                if (i,j) in cells:
+                    found.update(cells[i,j])
+        found.discard(exclude)
+        get_rect, collide = self.get_rect, rect.colliderect
+        hits = [sprite for sprite in found if collide(get_rect(sprite))]
+        hits.sort(key=self.order.__getitem__)
+        return hits
+
+    def spritecollide(self, sprite, dokill=False, collided=None, exclude=None):
+        """Equivalent to pg.sprite.spritecollide(sprite, self, ...)."""
+        hits = self.query(self.get_rect(sprite), exclude)
+        if collided:
+            hits = [hit for hit in hits if collided(sprite, hit)]
+        if dokill:
+            for hit in hits:
+                hit.kill()
+        return hits
+
+    def spritecollideany(self, sprite, collided=None, exclude=None):
+        """Equivalent to pg.sprite.spritecollideany(sprite, self, ...)."""
+        for hit in self.query(self.get_rect(sprite), exclude):
+            if not collided or collided(sprite, hit):
+                return hit
+        return None
@@ -0,0 +1,181 @@
+"""
+A frame profiler for the samples' main loops.  Each frame is split into named
+phases (events, update, draw, display and so on); the main loop calls mark
+after each phase and the time taken since the previous mark is charged to
+it.  Rolling 50th, 95th and 99th percentile times are kept for each phase
+over the last WINDOW frames.
+
+Percentiles are only recalculated every CAPTION_INTERVAL milliseconds, which
+is also how often end_frame asks for the window caption to be refreshed, so
+the caption is no longer formatted every frame.  An on-screen overlay of the
+per-phase percentiles can be shown, and the time of every phase of every
+frame can be written to a CSV file.  Rows are written as each frame ends, so
+nothing is held in memory however long the sample runs.  The columns are the
+phases marked in the first frame; a phase first marked later only counts
+towards the total.
+
+Edit the constants below to turn the overlay or CSV output on.
+"""
+
+import csv
+import time
+import collections
+
+import pygame as pg
+
+
+OVERLAY = False
+CSV_FILE = None
+WINDOW = 300
+CAPTION_INTERVAL = 500
+PERCENTILES = (50, 95, 99)
+
+try:
+    clock_ns = time.perf_counter_ns
+except AttributeError:
+    def clock_ns():
+        return int(time.time()*1e9)
+
+
+class FrameProfiler(object):
+    """Times the phases of each frame of a main loop."""
+    def __init__(self, overlay=OVERLAY, csv_file=CSV_FILE, window=WINDOW):
+        """
+        If overlay is true draw_overlay shows the per-phase percentiles on
+        screen; if csv_file is given every frame's phase times (in
+        nanoseconds) are written to it as the frame ends.  Call close when
+        done to close the file.
+        """
+        self.overlay = overlay
+        self.csv_file = csv_file
+        self.phases = []
+        self.samples = {}
+        self.totals = collections.deque(maxlen=window)
+        self.current = {}
+        self.writer = None
+        self.output = None
+        self.columns = 0
+        self.frames = 0
+        self.window = window
+        self.stats = {}
+        self.font = None
+        self.overlay_image = None
+        self.last = clock_ns()
+        self.refreshed = self.last
+
+    def start_frame(self):
+        """Call at the start of each frame."""
+        self.current.clear()
+        self.last = clock_ns()
+
+    def mark(self, phase):
+        """
+        Charge the time since the last mark (or the start of the frame) to
+        phase.  A phase marked more than once in a frame is summed.
+        """
+        now = clock_ns()
+        if phase not in self.samples:
+            self.phases.append(phase)
+            self.samples[phase] = collections.deque(maxlen=self.window)
+        self.current[phase] = self.current.get(phase, 0)+now-self.last
+        self.last = now
+
+    def end_frame(self):
+        """
+        Record the frame's phase times.  Returns True every CAPTION_INTERVAL
+        milliseconds, when the percentiles have been refreshed and the
+        caption should be updated.
+        """
+        times = [self.current.get(phase, 0) for phase in self.phases]
+        for phase, elapsed in zip(self.phases, times):
+            self.samples[phase].append(elapsed)
+        self.totals.append(sum(times))
+        if self.csv_file:
+            self.write_row(times)
+        self.frames += 1
+        if (self.last-self.refreshed)//1000000 >= CAPTION_INTERVAL:
+            self.refreshed = self.last
+            self.refresh()
+            return True
+        return False
+
+    def refresh(self):
+        """Recalculate the rolling percentiles for each phase."""
+        self.stats = {}
+        for phase in self.phases+["frame"]:
+            if phase == "frame":
+                times = sorted(self.totals)
+            else:
+                times = sorted(self.samples[phase])
+            if times:
+                self.stats[phase] = [get_percentile(times, percent)/1e6
+                                     for percent in PERCENTILES]
+        self.overlay_image = None
+
+    def get_summary(self):
+        """A short description of the frame time percentiles for captions."""
+        if "frame" not in self.stats:
+            return "Frame: -"
+        template = "Frame p50/p95/p99: {:.1f}/{:.1f}/{:.1f} ms"
+        return template.format(*self.stats["frame"])
+
+    def draw_overlay(self, surface):
+        """
+        Draw the per-phase percentiles to the top left of surface if the
+        overlay is enabled.  Returns the rect drawn, or None.
+        """
+        if not self.overlay or not self.stats:
+            return None
+        if self.overlay_image is None:
+            self.overlay_image = self.render_overlay()
+        return surface.blit(self.overlay_image, (0,0))
+
+    def render_overlay(self):
+        """Render the overlay table; only done when the stats change."""
+        if self.font is None:
+            self.font = pg.font.SysFont("monospace", 14)
+        header = "{:<8}".format("ms")+"".join("{:>7}".format("p{}".format(p))
+                                              for p in PERCENTILES)
+        lines = [header]
+        for phase in self.phases+["frame"]:
+            if phase in self.stats:
+                values = "".join("{:>7.2f}".format(value)
+                                 for value in self.stats[phase])
+                lines.append("{:<8}".format(phase[:8])+values)
+        images = [self.font.render(line, True, pg.Color("white"))
+                  for line in lines]
+        width = max(image.get_width() for image in images)+8
+        height = sum(image.get_height() for image in images)+8
+        overlay = pg.Surface((width, height)).convert()
+        overlay.fill(pg.Color("black"))
+        y = 4
+        for image in images:
+            overlay.blit(image, (4,y))
+            y += image.get_height()
+        return overlay
+
+    def write_row(self, times):
+        """
+        Write one frame's phase times to the CSV, opening it and writing the
+        header on the first frame.
+        """
+        if self.writer is None:
+            self.output = open(self.csv_file, "w")
+            self.writer = csv.writer(self.output)
+            self.columns = len(self.phases)
+            self.writer.writerow(["frame"]+["{}_ns".format(phase)
+                                            for phase in self.phases]+
+                                 ["total_ns"])
+        self.writer.writerow([self.frames]+times[:self.columns]+[sum(times)])
+
+    def close(self):
+        """Close the per-frame CSV, if one was written."""
+        if self.output is not None:
+            self.output.close()
+            self.output = self.writer = None
+
+
+def get_percentile(ordered, percent):
+    """Nearest rank percentile of an already sorted sequence."""
+    index = int(round(percent/100.0*(len(ordered)-1)))
+    return ordered[index]
@@ -0,0 +1,82 @@
+"""
+A sprite group for levels built on a lattice of equal square blocks.  Each
+cell of the lattice is one byte of a bytearray, set if a block fills it, so
+finding what a rect hits means reading the handful of cells the rect touches
+rather than testing every block in the level.  The cost of a collision check
+depends on the size of the rect, not on the size of the level.
+
+Sprites whose rects are not exactly one cell (or that lie outside the grid)
+are kept in an ordinary pg.sprite.Group and tested the old way.  Sprites
+placed in the grid must not move.
+"""
+
+import pygame as pg
+
+
+class BlockGrid(pg.sprite.Group):
+    """A pg.sprite.Group with constant time collision queries."""
+    def __init__(self, *sprites, **kwargs):
+        """
+        Accepts sprites exactly like a pg.sprite.Group.  The keyword
+        arguments are size, the (columns, rows) of the grid, and cell_size,
+        the width and height in pixels of each cell.
+        """
+        self.size = kwargs.pop("size")
+        self.cell_size = kwargs.pop("cell_size", 50)
+        self.cells = bytearray(self.size[0]*self.size[1])
+        self.occupants = {}
+        self.loose = pg.sprite.Group()
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def get_index(self, rect):
+        """
+        Return the index in cells of the cell rect exactly fills, or None
+        if it doesn't fill one.
+        """
+        size = self.cell_size
+        column, row = rect.x//size, rect.y//size
+        if rect != (column*size, row*size, size, size):
+            return None
+        if not (0 <= column < self.size[0] and 0 <= row < self.size[1]):
+            return None
+        return row*self.size[0]+column
+
+    def add_internal(self, sprite, *args):
+        """Place a new sprite in its cell, or with the loose sprites."""
+        pg.sprite.Group.add_internal(self, sprite, *args)
+        index = self.get_index(sprite.rect)
+        if index is None or self.cells[index]:
+            self.loose.add(sprite)
+        else:
+            self.cells[index] = 1
+            self.occupants[index] = sprite
+
+    def remove_internal(self, sprite):
+        """Remove a sprite from the group and from its cell."""
+        pg.sprite.Group.remove_internal(self, sprite)
+        index = self.get_index(sprite.rect)
+        if self.occupants.get(index) is sprite:
+            self.cells[index] = 0
+            del self.occupants[index]
+        else:
+            self.loose.remove(sprite)
+
+    def spritecollideany(self, sprite, collided=None):
+        """Equivalent to pg.sprite.spritecollideany(sprite, self, ...)."""
+        rect = sprite.rect
+        size = self.cell_size
+        columns, rows = self.size
+        left = max(rect.left//size, 0)
+        right = min((max(rect.right, rect.left+1)-1)//size, columns-1)
+        top = max(rect.top//size, 0)
+        bottom = min((max(rect.bottom, rect.top+1)-1)//size, rows-1)
+        cells = self.cells
+        for start in range(top*columns, bottom*columns+1, columns):
+            if any(cells[start+left:start+right+1]):
+                for index in range(start+left, start+right+1):
+                    hit = self.occupants.get(index)
+                    if hit and (not collided or collided(sprite, hit)):
+                        return hit
+        if self.loose:
+            return pg.sprite.spritecollideany(sprite, self.loose, collided)
+        return None
@@ -0,0 +1,367 @@
+#! /usr/bin/env python
+
+"""
+A crowd of AI controlled skeletons walking around the four_dir_obstacles
+level.  Rather than one Player object per walker, positions, facings and
+animation state are stored in NumPy arrays and every walker is moved and
+animated at once with vectorized operations.  Given the same input each
+walker behaves exactly like a four_dir_obstacles.Player.
+
+Collision uses the level's BlockGrid directly; its bytearray of occupied
+cells is viewed as a 2D array, so each walker's cells are a few array
+lookups.  The grid's loose (off lattice) sprites are tested against every
+walker at once, one sprite at a time.  All walkers are drawn with a single
+Surface.blits call.
+
+Walkers may be no larger than a grid cell and may not move more than a cell
+per frame.
+
+Requires NumPy.  Run from within the four_direction_movement directory:
+    python crowd.py --walkers 500
+    python crowd.py --walkers 5000 --headless --frames 300
+"""
+
+import os
+import sys
+import random
+import argparse
+import timeit
+
+import numpy as np
+import pygame as pg
+
+import four_dir_obstacles
+from frame_atlas import ATLAS
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+
+
+CAPTION = "4-Direction Movement: NumPy Crowd"
+SCREEN_SIZE = four_dir_obstacles.SCREEN_SIZE
+BACKGROUND_COLOR = four_dir_obstacles.BACKGROUND_COLOR
+
+DIRECTIONS = [pg.K_LEFT, pg.K_RIGHT, pg.K_UP, pg.K_DOWN]
+VECTORS = np.array([four_dir_obstacles.DIRECT_DICT[key]
+                    for key in DIRECTIONS])
+
+
+def make_frames(sheet, size):
+    """
+    The two walk frames of each direction, in the order of DIRECTIONS; the
+    frame for direction d and phase p is at index 2*d+p.  These are the
+    atlas's frames, so they are the very surfaces a Player would use.
+    """
+    frames = ATLAS.split_sheet(sheet, size, 4, 1)[0]
+    flips = ATLAS.split_sheet(sheet, size, 4, 1, flip_x=True)[0]
+    return [frames[0], frames[1], flips[0], flips[1],
+            frames[2], flips[2], frames[3], flips[3]]
+
+
+class Crowd(object):
+    """
+    Movement and animation for many walkers stored as NumPy arrays.  Each
+    walker is a rect of the same size with a direction (an index into
+    DIRECTIONS) and a flag saying whether it is walking, the equivalent of
+    a Player's direction and whether its direction_stack is empty.
+    """
+    def __init__(self, obstacles, locations, frames, size=(50,50), speed=3):
+        """
+        Obstacles is a BlockGrid; locations is a sequence of (x,y) topleft
+        coordinates, one per walker; frames is a list of images as returned
+        by make_frames.
+        """
+        self.obstacles = obstacles
+        columns, rows = obstacles.size
+        self.grid = np.frombuffer(obstacles.cells, np.uint8)
+        self.grid = self.grid.reshape(rows, columns)
+        self.cell_size = obstacles.cell_size
+        self.frames = frames
+        self.size = size
+        self.speed = speed
+        self.animate_fps = 7
+        locations = np.array(locations, dtype=np.int64).reshape(-1, 2)
+        count = len(locations)
+        self.x = locations[:,0].copy()
+        self.y = locations[:,1].copy()
+        self.direction = np.ones(count, dtype=np.int64)
+        self.old_direction = np.full(count, -1, dtype=np.int64)
+        self.walking = np.zeros(count, dtype=bool)
+        self.blocked = np.zeros(count, dtype=bool)
+        self.animate_timer = np.zeros(count)
+        self.phase = np.zeros((count, len(DIRECTIONS)), dtype=np.int64)
+        self.frame = np.zeros(count, dtype=np.int64)
+        self.animate(0)
+
+    def __len__(self):
+        return len(self.x)
+
+    def set_intent(self, direction, walking):
+        """
+        Direction is an array of indices into DIRECTIONS, one per walker;
+        walking is a boolean array of which walkers hold their direction.
+        """
+        self.direction[:] = direction
+        self.walking[:] = walking
+
+    def update(self, now):
+        """Equivalent of Player.update for every walker."""
+        self.animate(now)
+        self.blocked[:] = False
+        walkers = np.flatnonzero(self.walking)
+        vectors = VECTORS[self.direction[walkers]]
+        for axis in (0,1):
+            moving = np.flatnonzero(vectors[:,axis])
+            offsets = self.speed*vectors[moving,axis]
+            self.move(walkers[moving], offsets, axis)
+
+    def animate(self, now):
+        """
+        Equivalent of Player.adjust_images.  Each walker keeps the phase of
+        each direction's walk cycle, just as a Player keeps one
+        itertools.cycle per direction.
+        """
+        redraw = self.direction != self.old_direction
+        self.old_direction[:] = self.direction
+        elapsed = now-self.animate_timer > 1000.0/self.animate_fps
+        changed = np.flatnonzero(redraw | (self.walking & elapsed))
+        direction = self.direction[changed]
+        phase = self.phase[changed,direction]
+        self.frame[changed] = 2*direction+phase
+        self.phase[changed,direction] = 1-phase
+        self.animate_timer[changed] = now
+
+    def move(self, indices, offsets, axis):
+        """
+        Move the walkers at indices by offsets along axis (0 for x, 1 for y),
+        then push any that hit an obstacle out of it as
+        Player.adjust_on_collision does, until they are clear.
+        """
+        coords = self.y if axis else self.x
+        coords[indices] += offsets
+        while len(indices):
+            x, y = self.x[indices], self.y[indices]
+            hit, left, top, width, height = self.collide(x, y)
+            indices = indices[hit]
+            self.blocked[indices] = True
+            start = (top if axis else left)[hit]
+            end = start+(height if axis else width)[hit]
+            position = coords[indices]
+            coords[indices] = np.where(position < start,
+                                       start-self.size[axis], end)
+
+    def collide(self, x, y):
+        """
+        Find the obstacle each rect at x, y hits first, in the order
+        BlockGrid.spritecollideany would report it.  Returns an array of
+        which rects hit something and the left, top, width and height of
+        what they hit.
+        """
+        size = self.cell_size
+        rows, columns = self.grid.shape
+        count = len(x)
+        hit = np.zeros(count, dtype=bool)
+        left, top = np.zeros(count, np.int64), np.zeros(count, np.int64)
+        width = np.full(count, size, np.int64)
+        height = np.full(count, size, np.int64)
+        first_row, first_column = y//size, x//size
+        last_row = (y+self.size[1]-1)//size
+        last_column = (x+self.size[0]-1)//size
+        for row in (first_row, last_row):
+            for column in (first_column, last_column):
+                inside = ((row >= 0) & (row < rows) &
+                          (column >= 0) & (column < columns))
+                solid = np.zeros(count, dtype=bool)
+                solid[inside] = self.grid[row[inside],column[inside]] > 0
+                found = solid & ~hit
+                left[found] = column[found]*size
+                top[found] = row[found]*size
+                hit |= solid
+        for sprite in self.obstacles.loose:
+            rect = sprite.rect
+            found = ~hit & ((x < rect.right) & (x+self.size[0] > rect.x) &
+                            (y < rect.bottom) & (y+self.size[1] > rect.y))
+            left[found], top[found] = rect.topleft
+            width[found], height[found] = rect.size
+            hit |= found
+        return hit, left, top, width, height
+
+    def draw(self, surface):
+        """Draw every walker with a single Surface.blits call."""
+        images = map(self.frames.__getitem__, self.frame.tolist())
+        positions = zip(self.x.tolist(), self.y.tolist())
+        surface.blits(zip(images, positions), doreturn=False)
+
+
+class App(object):
+    """Runs a crowd of randomly wandering skeletons."""
+    def __init__(self, walkers):
+        self.screen = pg.display.get_surface()
+        self.screen_rect = self.screen.get_rect()
+        self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
+        self.fps = 60
+        self.done = False
+        self.blocks = four_dir_obstacles.App.make_blocks(self)
+        size = four_dir_obstacles.Player.SIZE
+        frames = make_frames(four_dir_obstacles.SKEL_IMAGE, size)
+        locations = self.spawn_locations(walkers, size)
+        self.crowd = Crowd(self.blocks, locations, frames, size)
+
+    def spawn_locations(self, walkers, size):
+        """Random, block free spots for the walkers to start."""
+        spots = [(x, y) for x in range(0, SCREEN_SIZE[0], 10)
+                 for y in range(0, SCREEN_SIZE[1], 10)
+                 if not self.blocks.spritecollideany(self.make_probe(x, y))]
+        return [random.choice(spots) for _ in range(walkers)]
+
+    def make_probe(self, x, y):
+        """A bare sprite with a walker sized rect at x, y."""
+        probe = pg.sprite.Sprite()
+        probe.rect = pg.Rect((x, y), four_dir_obstacles.Player.SIZE)
+        return probe
+
+    def think(self):
+        """
+        Very simple AI; each walker occasionally changes its mind, and
+        walkers that ran into something are more likely to.
+        """
+        crowd = self.crowd
+        count = len(crowd)
+        chance = np.where(crowd.blocked, 1/10.0, 1/60.0)
+        change = np.random.random(count) < chance
+        direction = crowd.direction.copy()
+        direction[change] = np.random.randint(0, 4, change.sum())
+        walking = crowd.walking.copy()
+        walking[change] = np.random.random(change.sum()) < 0.8
+        crowd.set_intent(direction, walking)
+
+    def event_loop(self):
+        """We can always quit."""
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                self.done = True
+            elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                self.done = True
+
+    def update(self, now):
+        """Update every walker."""
+        self.think()
+        self.crowd.update(now)
+
+    def render(self):
+        """Draw all necessary objects to the display surface."""
+        self.screen.fill(BACKGROUND_COLOR)
+        self.blocks.draw(self.screen)
+        self.crowd.draw(self.screen)
+
+    def display_fps(self):
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
+        pg.display.set_caption(caption)
+
+    def main_loop(self):
+        """Our main game loop."""
+        while not self.done:
+            self.profiler.start_frame()
+            self.event_loop()
+            self.profiler.mark("events")
+            self.update(pg.time.get_ticks())
+            self.profiler.mark("update")
+            self.render()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
+            pg.display.update()
+            self.profiler.mark("display")
+            self.clock.tick(self.fps)
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
+
+    def make_players(self):
+        """A four_dir_obstacles.Player standing in for each walker."""
+        crowd = self.crowd
+        players = []
+        for x, y in zip(crowd.x.tolist(), crowd.y.tolist()):
+            player = four_dir_obstacles.Player((0,0), crowd.speed)
+            player.rect.topleft = (x, y)
+            players.append(player)
+        return players
+
+    def benchmark(self, frames):
+        """
+        Run the crowd without a window, alongside one Player per walker
+        given the same input, and check that they agree every frame.
+        Print the walkers handled per millisecond by each for updating and
+        for drawing.
+        """
+        crowd = self.crowd
+        players = self.make_players()
+        group = pg.sprite.Group(players)
+        times = dict(crowd_update=0.0, crowd_draw=0.0,
+                     player_update=0.0, player_draw=0.0)
+        for frame in range(frames):
+            now = frame*1000.0/self.fps
+            start = timeit.default_timer()
+            self.update(now)
+            times["crowd_update"] += timeit.default_timer()-start
+            start = timeit.default_timer()
+            self.crowd.draw(self.screen)
+            times["crowd_draw"] += timeit.default_timer()-start
+            start = timeit.default_timer()
+            for i, player in enumerate(players):
+                player.direction = DIRECTIONS[crowd.direction[i]]
+                player.direction_stack = ([player.direction]
+                                          if crowd.walking[i] else [])
+                player.update(now, self.blocks)
+            times["player_update"] += timeit.default_timer()-start
+            start = timeit.default_timer()
+            group.draw(self.screen)
+            times["player_draw"] += timeit.default_timer()-start
+            for i, player in enumerate(players):
+                if (player.rect.topleft != (crowd.x[i], crowd.y[i]) or
+                        player.image is not crowd.frames[crowd.frame[i]]):
+                    sys.exit("Walker {} differs on frame {}".format(i, frame))
+        handled = len(crowd)*frames
+        print("{} walkers, {} frames; walkers per ms:".format(len(crowd),
+                                                                frames))
+        print("  {:<10} {:>10} {:>10}".format("", "update", "draw"))
+        for name in ("crowd", "player"):
+            rates = [handled/(1000*times[name+"_"+part])
+                     for part in ("update", "draw")]
+            print("  {:<10} {:>10.1f} {:>10.1f}".format(name, *rates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy four-direction crowd.")
+    parser.add_argument("--walkers", type=int, default=500)
+    parser.add_argument("--headless", action="store_true",
+                        help="benchmark against Players without a window")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    else:
+        os.environ['SDL_VIDEO_CENTERED'] = '1'
+    pg.init()
+    pg.display.set_caption(CAPTION)
+    pg.display.set_mode(SCREEN_SIZE)
+    sheet = pg.image.load("skelly.png").convert()
+    sheet.set_colorkey(four_dir_obstacles.COLOR_KEY)
+    four_dir_obstacles.SKEL_IMAGE = sheet
+    shade = pg.image.load("shader.png").convert_alpha()
+    four_dir_obstacles.SHADE_MASK = shade
+    run_it = App(args.walkers)
+    if args.headless:
+        run_it.benchmark(args.frames)
+    else:
+        run_it.main_loop()
+    pg.quit()
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,15 @@ import math
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from frame_atlas import ATLAS
+
 
 CAPTION = "8-Direction Movement w/ 4-Direction Animation"
 SCREEN_SIZE = (500, 500)
 BACKGROUND_COLOR = (40, 40, 40)
-TRANSPARENT = (0, 0, 0, 0)
 COLOR_KEY = (255, 0, 255)
 
 DIRECT_DICT = {pg.K_LEFT  : (-1, 0),
@@ -26,6 +30,8 @@ DIRECT_DICT = {pg.K_LEFT  : (-1, 0),
                pg.K_UP    : ( 0,-1),
                pg.K_DOWN  : ( 0, 1)}
 
+FRAME_INDICES = [(0,0), (1,0), (2,0), (3,0)]
+
 #X and Y Component magnitude when moving at 45 degree angles
 ANGLE_UNIT_SPEED = math.sqrt(2)/2
 
@@ -63,32 +69,29 @@ class Player(pg.sprite.Sprite):
     def make_mask(self):
         """
         Create a collision mask slightly smaller than our sprite so that
-        the sprite's head can overlap obstacles; adding depth.
+        the sprite's head can overlap obstacles; adding depth. The mask is
+        drawn directly rather than from a surface.
         """
-        mask_surface = pg.Surface(self.rect.size).convert_alpha()
-        mask_surface.fill(TRANSPARENT)
-        mask_surface.fill(pg.Color("white"), (10,20,30,30))
-        mask = pg.mask.from_surface(mask_surface)
+        mask = pg.mask.Mask(self.rect.size)
+        mask.draw(pg.mask.Mask((30,30), fill=True), (10,20))
         return mask
 
     def get_frames(self):
-        """Get a list of all frames."""
-        sheet = SKEL_IMAGE
-        indices = [[0,0], [1,0], [2,0], [3,0]]
-        return get_images(sheet, indices, self.rect.size)
+        """Get a list of all frames; these are shared by every Player."""
+        return ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES)
 
     def make_frame_dict(self):
         """
         Create a dictionary of direction keys to frames. We can use
-        transform functions to reduce the size of the sprite sheet needed.
+        transform functions to reduce the size of the sprite sheet needed;
+        the atlas only flips each frame once, for all Players.
         """
+        flips = ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES,
+                                 flip_x=True)
         frames = {pg.K_LEFT : [self.frames[0], self.frames[1]],
-                  pg.K_RIGHT: [pg.transform.flip(self.frames[0], True, False),
-                               pg.transform.flip(self.frames[1], True, False)],
-                  pg.K_DOWN : [self.frames[3],
-                               pg.transform.flip(self.frames[3], True, False)],
-                  pg.K_UP   : [self.frames[2],
-                               pg.transform.flip(self.frames[2], True, False)]}
+                  pg.K_RIGHT: [flips[0], flips[1]],
+                  pg.K_DOWN : [self.frames[3], flips[3]],
+                  pg.K_UP   : [self.frames[2], flips[2]]}
         return frames
 
     def adjust_images(self):
@@ -181,6 +184,7 @@ class Control(object):
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.done = False
         self.keys = pg.key.get_pressed()
@@ -216,29 +220,31 @@ class Control(object):
         self.player.draw(self.screen)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """Our main game loop; I bet you'd never have guessed."""
         delta = self.clock.tick(self.fps)/1000.0
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.player.update(self.obstacles, delta)
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             delta = self.clock.tick(self.fps)/1000.0
-            self.display_fps()
-
-
-def get_images(sheet, frame_indices, size):
-    """Get desired images from a sprite sheet."""
-    frames = []
-    for cell in frame_indices:
-        frame_rect = ((size[0]*cell[0],size[1]*cell[1]), size)
-        frames.append(sheet.subsurface(frame_rect))
-    return frames
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def divfmod(x, y):
@@ -15,6 +15,11 @@ import itertools
 
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from frame_atlas import ATLAS
+
 
 CAPTION = "4-Direction Movement with Animation"
 SCREEN_SIZE = (500, 500)
@@ -56,10 +61,12 @@ class Player(object):
     def make_frame_dict(self):
         """
         Create a dictionary of direction keys to frame cycles. We can use
-        transform functions to reduce the size of the sprite sheet needed.
+        transform functions to reduce the size of the sprite sheet needed;
+        the atlas only slices and flips the sheet once, for all Players.
         """
-        frames = split_sheet(SKEL_IMAGE, Player.SIZE, 4, 1)[0]
-        flips = [pg.transform.flip(frame, True, False) for frame in frames]
+        sheet = SKEL_IMAGE
+        frames = ATLAS.split_sheet(sheet, Player.SIZE, 4, 1)[0]
+        flips = ATLAS.split_sheet(sheet, Player.SIZE, 4, 1, flip_x=True)[0]
         walk_cycles = {pg.K_LEFT : itertools.cycle(frames[0:2]),
                        pg.K_RIGHT: itertools.cycle(flips[0:2]),
                        pg.K_DOWN : itertools.cycle([frames[3], flips[3]]),
@@ -145,6 +152,7 @@ class App(object):
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock  = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60
         self.done = False
         self.keys = pg.key.get_pressed()
@@ -163,9 +171,11 @@ class App(object):
 
     def display_fps(self):
         """
-        Show the program's FPS in the window handle.
+        Show the program's FPS and frame times in the window handle.
         """
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def update(self):
@@ -178,40 +188,31 @@ class App(object):
 
     def render(self):
         """
-        Perform all necessary drawing and update the screen.
+        Perform all necessary drawing.
         """
         self.screen.fill(BACKGROUND_COLOR)
         self.player.draw(self.screen)
-        pg.display.update()
-        
+
     def main_loop(self):
         """
         Our main game loop; I bet you'd never have guessed.
         """
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
+            self.profiler.mark("update")
             self.render()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
+            pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
-
-
-def split_sheet(sheet, size, columns, rows):
-    """
-    Divide a loaded sprite sheet into subsurfaces.
-    
-    The argument size is the width and height of each frame (w,h)
-    columns and rows are the integer number of cells horizontally and
-    vertically.
-    """
-    subsurfaces = []
-    for y in range(rows):
-        row = []
-        for x in range(columns): 
-            rect = pg.Rect((x*size[0], y*size[1]), size)
-            row.append(sheet.subsurface(rect))
-        subsurfaces.append(row)
-    return subsurfaces
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def main():
@@ -1,10 +1,11 @@
 """
 Shows the direction of collision. This method uses masks (pixel perfect)
 collision methods, and is a little (possibly over) complicated. It finds the
-direction of a collision by calculating a finite difference between colliding
-mask elements in both directions. This technique can be extended to find the
-actually angle of collision (normal vector) between two simple colliding
-shapes.
+direction of a collision from the mask of the overlapping pixels; the axis
+along which the overlap is thinnest gives the contact normal, and the
+overlap's extent how far the player must back out. This technique can be
+extended to find the actual angle of collision (normal vector) between two
+simple colliding shapes.
 
 -Written by Sean J. McKiernan 'Mekire'
 """
@@ -14,6 +15,12 @@ import sys
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from frame_atlas import ATLAS
+from text_cache import TEXT_CACHE
+
 
 CAPTION = "Direction of Collision: Masks"
 SCREEN_SIZE = (500, 500)
@@ -26,11 +33,18 @@ DIRECT_DICT = {pg.K_LEFT  : (-1, 0),
                pg.K_UP    : ( 0,-1),
                pg.K_DOWN  : ( 0, 1)}
 
+FRAME_INDICES = [(0,0), (1,0), (2,0), (3,0)]
+
 OPPOSITE_DICT = {pg.K_LEFT  : "right",
                  pg.K_RIGHT : "left",
                  pg.K_UP    : "bottom",
                  pg.K_DOWN  : "top"}
 
+EDGE_DICT = {(-1, 0) : "right",
+             ( 1, 0) : "left",
+             ( 0,-1) : "bottom",
+             ( 0, 1) : "top"}
+
 
 class Player(pg.sprite.Sprite):
     """
@@ -47,6 +61,7 @@ class Player(pg.sprite.Sprite):
         pg.sprite.Sprite.__init__(self)
         self.rect = pg.Rect(rect)
         self.mask = self.make_mask()
+        self.mask_center = self.mask.centroid()
         self.speed = speed
         self.direction = direction
         self.collision_direction = None
@@ -66,32 +81,29 @@ class Player(pg.sprite.Sprite):
     def make_mask(self):
         """
         Create a collision mask slightly smaller than our sprite so that
-        the sprite's head can overlap obstacles; adding depth.
+        the sprite's head can overlap obstacles; adding depth. The mask is
+        drawn directly rather than from a surface.
         """
-        mask_surface = pg.Surface(self.rect.size).convert_alpha()
-        mask_surface.fill((0,0,0,0))
-        mask_surface.fill(pg.Color("white"), (10,20,30,30))
-        mask = pg.mask.from_surface(mask_surface)
+        mask = pg.mask.Mask(self.rect.size)
+        mask.draw(pg.mask.Mask((30,30), fill=True), (10,20))
         return mask
 
     def get_frames(self):
-        """Get a list of all frames."""
-        sheet = SKEL_IMAGE
-        indices = [[0,0],[1,0],[2,0],[3,0]]
-        return get_images(sheet,indices,self.rect.size)
+        """Get a list of all frames; these are shared by every Player."""
+        return ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES)
 
     def make_frame_dict(self):
         """
         Create a dictionary of direction keys to frames. We can use
-        transform functions to reduce the size of the sprite sheet needed.
+        transform functions to reduce the size of the sprite sheet needed;
+        the atlas only flips each frame once, for all Players.
         """
+        flips = ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES,
+                                 flip_x=True)
         frames = {pg.K_LEFT : [self.frames[0], self.frames[1]],
-                  pg.K_RIGHT: [pg.transform.flip(self.frames[0], True, False),
-                               pg.transform.flip(self.frames[1], True, False)],
-                  pg.K_DOWN : [self.frames[3],
-                               pg.transform.flip(self.frames[3], True, False)],
-                  pg.K_UP   : [self.frames[2],
-                               pg.transform.flip(self.frames[2], True, False)]}
+                  pg.K_RIGHT: [flips[0], flips[1]],
+                  pg.K_DOWN : [self.frames[3], flips[3]],
+                  pg.K_UP   : [self.frames[2], flips[2]]}
         return frames
 
     def adjust_images(self):
@@ -139,44 +151,36 @@ class Player(pg.sprite.Sprite):
             self.movement(obstacles, 1)
 
     def movement(self, obstacles, i):
-        """Move player and then check for collisions; adjust as necessary."""
+        """
+        Move player and then check for collisions; adjust as necessary.
+        Rather than retreating a pixel at a time, the player backs out of
+        each obstacle hit by the overlap's extent along this axis.
+        """
         change = self.speed*DIRECT_DICT[self.direction][i]
         self.rect[i] += change
         collisions = pg.sprite.spritecollide(self, obstacles, False)
         callback = pg.sprite.collide_mask
         collide = pg.sprite.spritecollideany(self, collisions, callback)
-        if collide and not self.collision_direction:
-            self.collision_direction = self.get_collision_direction(collide)
         while collide:
-            self.rect[i] += (1 if change<0 else -1)
+            offset = (collide.rect.x-self.rect.x, collide.rect.y-self.rect.y)
+            penetration = get_penetration(self.mask, collide.mask, offset,
+                                          self.mask_center)
+            if not self.collision_direction:
+                self.collision_direction = self.get_collision_direction(
+                                               penetration)
+            retreat = penetration[2][i]
+            self.rect[i] += (retreat if change<0 else -retreat)
             collide = pg.sprite.spritecollideany(self, collisions, callback)
 
-    def get_collision_direction(self, other_sprite):
-        """Find what side of an object the player is running into."""
-        dx = self.get_finite_difference(other_sprite, 0, self.speed)
-        dy = self.get_finite_difference(other_sprite, 1, self.speed)
-        abs_x, abs_y = abs(dx), abs(dy)
-        if abs_x > abs_y:
-            return ("right" if dx>0 else "left")
-        elif abs_x < abs_y:
-            return ("bottom" if dy>0 else "top")
-        else:
-            return OPPOSITE_DICT[self.direction]
-
-    def get_finite_difference(self, other_sprite, index, delta=1):
+    def get_collision_direction(self, penetration):
         """
-        Find the finite difference in area of mask collision with the
-        rects position incremented and decremented in axis index.
+        Find what side of an object the player is running into from the
+        contact normal; corner hits go by the direction we are moving.
         """
-        base_offset = [other_sprite.rect.x-self.rect.x,
-                       other_sprite.rect.y-self.rect.y]
-        offset_high = base_offset[:]
-        offset_low = base_offset[:]
-        offset_high[index] += delta
-        offset_low[index] -= delta
-        first_term = self.mask.overlap_area(other_sprite.mask, offset_high)
-        second_term = self.mask.overlap_area(other_sprite.mask, offset_low)
-        return first_term - second_term
+        normal = penetration[0]
+        if normal[0] and normal[1]:
+            return OPPOSITE_DICT[self.direction]
+        return EDGE_DICT[normal]
 
     def draw(self, surface):
         """Draw method seperated out from update."""
@@ -202,13 +206,12 @@ class Block(pg.sprite.Sprite):
 
 class Control(object):
     """Being controlling is our job."""
-    text_cache = {}
-
     def __init__(self):
         """Initialize standard attributes standardly."""
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.done = False
         self.keys = pg.key.get_pressed()
@@ -229,15 +232,11 @@ class Control(object):
     def render_text(self, text, font, color, cache=True):
         """
         Returns a rendered surface of the text; if available the surface is
-        retrieved from the text_cache to avoid rerendering.
+        retrieved from the shared text cache to avoid rerendering.
         """
-        if text in Control.text_cache:
-            return Control.text_cache[text]
-        else:
-            image = font.render(text, True, color)
-            if cache:
-                Control.text_cache[text] = image
-            return image
+        if cache:
+            return TEXT_CACHE.render(font, text, color)
+        return font.render(text, True, color)
 
     def event_loop(self):
         """Add/pop directions from player's direction stack as necessary."""
@@ -267,28 +266,63 @@ class Control(object):
             self.screen.blit(image, rect)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """Our main game loop; I bet you'd never have guessed."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.player.update(self.obstacles)
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
-def get_images(sheet,frame_indices,size):
-    """Get desired images from a sprite sheet."""
-    frames = []
-    for cell in frame_indices:
-        frame_rect = ((size[0]*cell[0],size[1]*cell[1]), size)
-        frames.append(sheet.subsurface(frame_rect))
-    return frames
+def get_penetration(mask, other_mask, offset, center=None):
+    """
+    Find how mask overlaps other_mask (placed at offset relative to it) from
+    their overlap mask.  Returns None if they don't overlap; otherwise a
+    (normal, depth, size) tuple.  Size is the (width, height) of the
+    overlap, counted as the columns and rows it covers: the pixels it loses
+    when overlapped with itself shifted by one row or column.  For shapes
+    whose rows and columns are unbroken (convex shapes) this is the size of
+    its bounding rect, and moving mask back by it along an axis separates
+    them.  The contact normal is the axis along which the overlap is
+    thinnest, pointing from center (by default the centroid of mask) toward
+    the overlap, and depth is the overlap's size along it.  If the overlap
+    is square the normal is diagonal.  As the overlap lies against one side
+    of mask along its thinnest axis, any one of its pixels gives the side;
+    this is much cheaper than finding its centroid.
+    """
+    overlap = mask.overlap_mask(other_mask, offset)
+    count = overlap.count()
+    if not count:
+        return None
+    width = count-overlap.overlap_area(overlap, (0,1))
+    height = count-overlap.overlap_area(overlap, (1,0))
+    if center is None:
+        center = mask.centroid()
+    point = overlap.overlap(overlap, (0,0))
+    signs = [1 if point[i] >= center[i] else -1 for i in (0,1)]
+    if width < height:
+        return (signs[0], 0), width, (width, height)
+    elif width > height:
+        return (0, signs[1]), height, (width, height)
+    return (signs[0], signs[1]), width, (width, height)
 
 
 def main():
@@ -12,6 +12,12 @@ import sys
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from frame_atlas import ATLAS
+from text_cache import TEXT_CACHE
+
 
 CAPTION = "Direction of Collision: Naive"
 SCREEN_SIZE = (500, 500)
@@ -24,6 +30,8 @@ DIRECT_DICT = {pg.K_LEFT  : (-1, 0),
                pg.K_UP    : ( 0,-1),
                pg.K_DOWN  : ( 0, 1)}
 
+FRAME_INDICES = [(0,0), (1,0), (2,0), (3,0)]
+
 
 class Player(pg.sprite.Sprite):
     """
@@ -57,23 +65,21 @@ class Player(pg.sprite.Sprite):
         self.adjust_images()
 
     def get_frames(self):
-        """Get a list of all frames."""
-        sheet = SKEL_IMAGE
-        indices = [[0,0], [1,0], [2,0], [3,0]]
-        return get_images(sheet, indices, self.rect.size)
+        """Get a list of all frames; these are shared by every Player."""
+        return ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES)
 
     def make_frame_dict(self):
         """
         Create a dictionary of direction keys to frames. We can use
-        transform functions to reduce the size of the sprite sheet needed.
+        transform functions to reduce the size of the sprite sheet needed;
+        the atlas only flips each frame once, for all Players.
         """
+        flips = ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES,
+                                 flip_x=True)
         frames = {pg.K_LEFT : [self.frames[0], self.frames[1]],
-                  pg.K_RIGHT: [pg.transform.flip(self.frames[0], True, False),
-                               pg.transform.flip(self.frames[1], True, False)],
-                  pg.K_DOWN : [self.frames[3],
-                               pg.transform.flip(self.frames[3], True, False)],
-                  pg.K_UP   : [self.frames[2],
-                               pg.transform.flip(self.frames[2], True, False)]}
+                  pg.K_RIGHT: [flips[0], flips[1]],
+                  pg.K_DOWN : [self.frames[3], flips[3]],
+                  pg.K_UP   : [self.frames[2], flips[2]]}
         return frames
 
     def adjust_images(self):
@@ -171,13 +177,12 @@ class Block(pg.sprite.Sprite):
 
 class Control(object):
     """Being controlling is our job."""
-    text_cache = {}
-
     def __init__(self):
         """Initialize standard attributes standardly."""
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.done = False
         self.keys = pg.key.get_pressed()
@@ -198,15 +203,11 @@ class Control(object):
     def render_text(self, text, font, color, cache=True):
         """
         Returns a rendered surface of the text; if available the surface is
-        retrieved from the text_cache to avoid rerendering.
+        retrieved from the shared text cache to avoid rerendering.
         """
-        if text in Control.text_cache:
-            return Control.text_cache[text]
-        else:
-            image = font.render(text, True, color)
-            if cache:
-                Control.text_cache[text] = image
-            return image
+        if cache:
+            return TEXT_CACHE.render(font, text, color)
+        return font.render(text, True, color)
 
     def event_loop(self):
         """Add/pop directions from player's direction stack as necessary."""
@@ -236,28 +237,30 @@ class Control(object):
             self.screen.blit(image, rect)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """Our main game loop; I bet you'd never have guessed."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.player.update(self.obstacles)
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
-
-
-def get_images(sheet, frame_indices, size):
-    """Get desired images from a sprite sheet."""
-    frames = []
-    for cell in frame_indices:
-        frame_rect = ((size[0]*cell[0],size[1]*cell[1]), size)
-        frames.append(sheet.subsurface(frame_rect))
-    return frames
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def main():
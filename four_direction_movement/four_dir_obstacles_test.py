@@ -1,7 +1,9 @@
 """
-This script demonstrate writing a custom collided callback function for
-pygame.sprite.spritecollide. This can be useful and isn't particularly
-intuitive from the documentation, but is by no means required reading.
+This script demonstrates a sprite that collides using a different rect (its
+hitrect) than the one it is drawn with. It originally did so by passing a
+custom collided callback to pygame.sprite.spritecollide; the obstacles are
+now kept in a HitboxGroup (see hitbox_group.py) which understands hitrects
+itself, so no callback is needed and only nearby obstacles are tested.
 
 -Written by Sean J. McKiernan 'Mekire'
 """
@@ -11,6 +13,12 @@ import sys
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from frame_atlas import ATLAS
+from hitbox_group import HitboxGroup, get_hitbox
+
 
 CAPTION = "Collided Callback Test"
 SCREEN_SIZE = (500, 500)
@@ -22,16 +30,7 @@ DIRECT_DICT = {pg.K_LEFT  : (-1, 0),
                pg.K_UP    : ( 0,-1),
                pg.K_DOWN  : ( 0, 1)}
 
-
-def collide_other(other):
-    """
-    The other argument is a pygame.Rect that you would like to use for
-    sprite collision. Return value is a collided callable for use with the
-    pygame.sprite.spritecollide function.
-    """
-    def collide(one, two):
-        return other.colliderect(two.rect)
-    return collide
+FRAME_INDICES = [(0,0), (1,0), (2,0), (3,0)]
 
 
 class Player(pg.sprite.Sprite):
@@ -70,23 +69,21 @@ class Player(pg.sprite.Sprite):
         self.hitrect.midbottom = self.rect.midbottom
 
     def get_frames(self):
-        """Get a list of all frames."""
-        sheet = SKEL_IMAGE
-        indices = [[0,0], [1,0], [2,0], [3,0]]
-        return get_images(sheet, indices, self.rect.size)
+        """Get a list of all frames; these are shared by every Player."""
+        return ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES)
 
     def make_frame_dict(self):
         """
         Create a dictionary of direction keys to frames. We can use
-        transform functions to reduce the size of the sprite sheet we need.
+        transform functions to reduce the size of the sprite sheet we need;
+        the atlas only flips each frame once, for all Players.
         """
+        flips = ATLAS.get_frames(SKEL_IMAGE, self.rect.size, FRAME_INDICES,
+                                 flip_x=True)
         frames = {pg.K_LEFT : [self.frames[0], self.frames[1]],
-                  pg.K_RIGHT: [pg.transform.flip(self.frames[0], True, False),
-                               pg.transform.flip(self.frames[1], True, False)],
-                  pg.K_DOWN : [self.frames[3],
-                               pg.transform.flip(self.frames[3], True, False)],
-                  pg.K_UP   : [self.frames[2],
-                               pg.transform.flip(self.frames[2], True, False)]}
+                  pg.K_RIGHT: [flips[0], flips[1]],
+                  pg.K_DOWN : [self.frames[3], flips[3]],
+                  pg.K_UP   : [self.frames[2], flips[2]]}
         return frames
 
     def adjust_images(self):
@@ -136,23 +133,18 @@ class Player(pg.sprite.Sprite):
         """Move player and then check for collisions; adjust as necessary."""
         direction_vector = DIRECT_DICT[self.direction]
         self.hitrect[i] += self.speed*direction_vector[i]
-        callback = collide_other(self.hitrect)  #Collidable callback created.
-        collisions = pg.sprite.spritecollide(self, obstacles, False, callback)
+        collisions = obstacles.spritecollide(self)
         while collisions:
             collision = collisions.pop()
             self.adjust_on_collision(self.hitrect, collision, i)
-        self.rect.midbottom = self.hitrect.midbottom
 
     def adjust_on_collision(self, rect_to_adjust, collide, i):
         """Adjust player's position if colliding with a solid block."""
-        if rect_to_adjust[i] < collide.rect[i]:
-            rect_to_adjust[i] = collide.rect[i]-rect_to_adjust.size[i]
+        hitbox = get_hitbox(collide)
+        if rect_to_adjust[i] < hitbox[i]:
+            rect_to_adjust[i] = hitbox[i]-rect_to_adjust.size[i]
         else:
-            rect_to_adjust[i] = collide.rect[i]+collide.rect.size[i]
-
-    def draw(self, surface):
-        """Draw method seperated out from update."""
-        surface.blit(self.image, self.rect)
+            rect_to_adjust[i] = hitbox[i]+hitbox.size[i]
 
 
 class Block(pg.sprite.Sprite):
@@ -178,11 +170,13 @@ class Control(object):
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.done = False
         self.keys = pg.key.get_pressed()
         self.player = Player((0,0,50,50), 3)
         self.player.set_rects(self.screen_rect.center, "center")
+        self.actors = HitboxGroup(self.player)
         self.obstacles = self.make_obstacles()
 
     def make_obstacles(self):
@@ -193,7 +187,7 @@ class Control(object):
             obstacles.append(Block((450,50*i)))
             obstacles.append(Block((50+i*50,450)))
             obstacles.append(Block((0,50+50*i)))
-        return pg.sprite.Group(obstacles)
+        return HitboxGroup(obstacles)
 
     def event_loop(self):
         """Add/pop directions from player's direction stack as necessary."""
@@ -206,35 +200,45 @@ class Control(object):
             elif event.type == pg.KEYUP:
                 self.player.pop_direction(event.key)
 
+    def update(self):
+        """
+        Update the player. Only its hitrect moves; its rect is brought back
+        in line when the actors are drawn.
+        """
+        self.player.update(self.obstacles)
+        self.actors.relocate(self.player)
+
     def draw(self):
         """Draw all elements to the display surface."""
         self.screen.fill(BACKGROUND_COLOR)
         self.obstacles.draw(self.screen)
-        self.player.draw(self.screen)
+        self.actors.draw(self.screen)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """Our main game loop; I bet you'd never have guessed."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
-            self.player.update(self.obstacles)
+            self.profiler.mark("events")
+            self.update()
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
-
-
-def get_images(sheet, frame_indices, size):
-    """Get desired images from a sprite sheet."""
-    frames = []
-    for cell in frame_indices:
-        frame_rect = ((size[0]*cell[0],size[1]*cell[1]), size)
-        frames.append(sheet.subsurface(frame_rect))
-    return frames
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def main():
@@ -0,0 +1,138 @@
+"""
+A process wide cache of sprite sheet frames.  Frames are keyed by the sheet,
+the cell size, the cell index and the flip flags; each is cut from its sheet
+(as a subsurface, sharing the sheet's pixels) or flipped exactly once, and
+the same surface is then handed to every sprite that asks for it.  Creating
+another Player therefore costs no new surfaces, rather than re-slicing and
+re-flipping the sprite sheet every time.
+
+Frames are never modified by the samples; anything that wants to draw on a
+frame must copy it first.
+
+Run this module (from within the four_direction_movement directory) to time
+creating 1000 Players of each sample with and without sharing frames, and to
+report the atlas's memory footprint.
+"""
+
+import os
+import timeit
+
+import pygame as pg
+
+
+PLAYERS = 1000
+
+
+class FrameAtlas(object):
+    """A cache of sprite sheet frames and their flipped variants."""
+    def __init__(self):
+        self.frames = {}
+
+    def get(self, sheet, size, index, flip_x=False, flip_y=False):
+        """
+        Return the frame of size (w,h) at cell index (column, row) of sheet,
+        flipped as requested.
+        """
+        key = (sheet, tuple(size), tuple(index), flip_x, flip_y)
+        frame = self.frames.get(key)
+        if frame is None:
+            if flip_x or flip_y:
+                frame = self.get(sheet, size, index)
+                frame = pg.transform.flip(frame, flip_x, flip_y)
+            else:
+                rect = pg.Rect((size[0]*index[0], size[1]*index[1]), size)
+                frame = sheet.subsurface(rect)
+            self.frames[key] = frame
+        return frame
+
+    def get_frames(self, sheet, size, indices, flip_x=False, flip_y=False):
+        """Return a list of the frames at each cell index in indices."""
+        return [self.get(sheet, size, index, flip_x, flip_y)
+                for index in indices]
+
+    def split_sheet(self, sheet, size, columns, rows, flip_x=False,
+                    flip_y=False):
+        """
+        Divide a sprite sheet into rows of frames.  The argument size is the
+        width and height of each frame (w,h); columns and rows are the
+        integer number of cells horizontally and vertically.
+        """
+        return [self.get_frames(sheet, size, [(x,y) for x in range(columns)],
+                                flip_x, flip_y)
+                for y in range(rows)]
+
+    def get_footprint(self):
+        """
+        Return (frames, owned, shared): the number of frames cached, the
+        bytes of pixels owned by the flipped frames, and the bytes of sheet
+        pixels the unflipped frames are views of.
+        """
+        owned = shared = 0
+        for frame in self.frames.values():
+            width, height = frame.get_size()
+            size = width*height*frame.get_bytesize()
+            if frame.get_parent() is None:
+                owned += size
+            else:
+                shared += size
+        return len(self.frames), owned, shared
+
+    def get_report(self):
+        """A one line summary of the atlas's memory footprint."""
+        template = "{} frames: {:.1f} KiB owned, {:.1f} KiB viewed in sheets"
+        frames, owned, shared = self.get_footprint()
+        return template.format(frames, owned/1024.0, shared/1024.0)
+
+
+ATLAS = FrameAtlas()
+
+
+def main():
+    """
+    Time creating Players of each sample, first re-slicing and re-flipping
+    the sheet for every Player (by emptying the atlas each time) as before,
+    then sharing the atlas.
+    """
+    # The samples share the atlas of the imported module, not this script's.
+    import frame_atlas
+    import four_dir_anim
+    import four_dir_obstacles
+    import four_dir_naive
+    import four_dir_mask
+    import four_dir_obstacles_test
+    import eight_dir_move_four_dir_anim as eight_dir
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    pg.display.set_mode((500, 500))
+    sheet = pg.image.load("skelly.png").convert()
+    sheet.set_colorkey(four_dir_anim.COLOR_KEY)
+    atlas = frame_atlas.ATLAS
+    rect = (0, 0, 50, 50)
+    makers = [(four_dir_anim, lambda: four_dir_anim.Player((0,0), 3)),
+              (four_dir_obstacles,
+               lambda: four_dir_obstacles.Player((0,0), 3)),
+              (four_dir_naive, lambda: four_dir_naive.Player(rect, 3)),
+              (four_dir_mask, lambda: four_dir_mask.Player(rect, 3)),
+              (four_dir_obstacles_test,
+               lambda: four_dir_obstacles_test.Player(rect, 3)),
+              (eight_dir, lambda: eight_dir.Player(rect, 3))]
+    print("Time to create {} Players (ms):".format(PLAYERS))
+    print("  {:<30} {:>10} {:>10}".format("", "unshared", "shared"))
+    for module, make in makers:
+        module.SKEL_IMAGE = sheet
+        times = []
+        for shared in (False, True):
+            players = []
+            start = timeit.default_timer()
+            for _ in range(PLAYERS):
+                if not shared:
+                    atlas.frames.clear()
+                players.append(make())
+            times.append(1000*(timeit.default_timer()-start))
+        print("  {:<30} {:>10.1f} {:>10.1f}".format(module.__name__, *times))
+    print(atlas.get_report())
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compares four_dir_obstacles' collision checks against a BlockGrid with the
+old approach of calling pg.sprite.spritecollideany on a plain Group of every
+block.  A player is walked at random through levels of 10x10, 100x100 and
+1000x1000 cells, each with a solid border and a scattering of blocks.  The
+positions reached must be identical, and the average cost of a move is
+printed for each.  The plain Group is skipped for the largest level, as each
+of its checks visits every one of about 100000 blocks.
+
+Runs headless; run it from within the four_direction_movement directory.
+"""
+
+import os
+import sys
+import random
+import timeit
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+import pygame as pg
+
+import four_dir_obstacles
+from block_grid import BlockGrid
+
+
+SIZES = (10, 100, 1000)
+DENSITY = 0.1
+MOVES = 2000
+GROUP_LIMIT = 100
+REPEATS = 5
+
+
+def old_movement(player, obstacles, i):
+    """The original movement of four_dir_obstacles."""
+    direction_vector = four_dir_obstacles.DIRECT_DICT[player.direction]
+    player.rect[i] += player.speed*direction_vector[i]
+    collision = pg.sprite.spritecollideany(player, obstacles)
+    while collision:
+        player.adjust_on_collision(collision, i)
+        collision = pg.sprite.spritecollideany(player, obstacles)
+
+
+def make_level(size):
+    """
+    A level of size by size cells as a plain Group and as a BlockGrid.  The
+    middle cell, where the player starts, is left clear.
+    """
+    rng = random.Random(size)
+    grid = BlockGrid(size=(size, size), cell_size=50)
+    for row in range(size):
+        for column in range(size):
+            edge = row in (0, size-1) or column in (0, size-1)
+            middle = row == column == size//2
+            if edge or (not middle and rng.random() < DENSITY):
+                block = pg.sprite.Sprite()
+                block.rect = pg.Rect(column*50, row*50, 50, 50)
+                grid.add(block)
+    return pg.sprite.Group(grid.sprites()), grid
+
+
+def walk(player, obstacles, move, keys):
+    """Move player once in each key's direction; return its positions."""
+    positions = []
+    for key in keys:
+        player.direction = key
+        move(player, obstacles, 0 if key in (pg.K_LEFT, pg.K_RIGHT) else 1)
+        positions.append(player.rect.topleft)
+    return positions
+
+
+def main():
+    pg.init()
+    pg.display.set_mode(four_dir_obstacles.SCREEN_SIZE)
+    sheet = pg.image.load("skelly.png").convert()
+    sheet.set_colorkey(four_dir_obstacles.COLOR_KEY)
+    four_dir_obstacles.SKEL_IMAGE = sheet
+    rng = random.Random(0)
+    directions = sorted(four_dir_obstacles.DIRECT_DICT)
+    keys = [rng.choice(directions) for _ in range(MOVES)]
+    moves = ((0, old_movement), (1, four_dir_obstacles.Player.movement))
+    print("  {:>10} {:>8} {:>14} {:>14}".format("cells", "blocks",
+                                                 "group (us)", "grid (us)"))
+    for size in SIZES:
+        levels = make_level(size)
+        start = (size//2*50+25, size//2*50+25)
+        player = four_dir_obstacles.Player(start, 3)
+        times = [float("nan"), float("nan")]
+        results = []
+        for which, move in moves:
+            if which == 0 and size > GROUP_LIMIT:
+                continue
+            def run():
+                player.rect.center = start
+                return walk(player, levels[which], move, keys)
+            results.append(run())
+            timer = timeit.Timer(run)
+            times[which] = 1e6*min(timer.repeat(REPEATS, 1))/MOVES
+        if any(result != results[0] for result in results):
+            sys.exit("Positions differ in the {0}x{0} level".format(size))
+        print("  {:>10} {:>8} {:>14.1f} {:>14.1f}".format(
+              "{0}x{0}".format(size), len(levels[0]), *times))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+A sprite group for sprites that collide with a different rect than the one
+they are drawn at.  A sprite's hitbox is its hitrect attribute if it has
+one, and its rect otherwise.  This is the cell hash group shared with the
+platforming samples (see common/cell_hash.py), keyed on hitboxes: sprites
+are bucketed by their hitboxes, and queries test the hitboxes of the sprites
+in the cells a query overlaps directly, rather than through a collided
+callback passed to pg.sprite.spritecollide.
+
+Sprites whose hitboxes move must be passed to HitboxGroup.relocate after
+moving.  Their draw rects are not touched then; the group brings them back
+into line with their hitboxes (by the anchor point, midbottom by default)
+only when it is drawn, or when sync is called.
+"""
+
+import os
+import sys
+
+import pygame as pg
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.cell_hash import CellHashGroup
+
+
+def get_hitbox(sprite):
+    """Return the rect sprite collides with."""
+    return getattr(sprite, "hitrect", sprite.rect)
+
+
+class HitboxGroup(CellHashGroup):
+    """A CellHashGroup of sprites bucketed and tested by their hitboxes."""
+    cell_size = 100
+    get_rect = staticmethod(get_hitbox)
+
+    def __init__(self, *sprites, **kwargs):
+        """
+        Accepts sprites exactly like a pg.sprite.Group.  The keyword
+        arguments are cell_size, the width and height in pixels of each grid
+        cell, and anchor, the point of a sprite's rect kept at the same
+        point of its hitbox.
+        """
+        self.anchor = kwargs.pop("anchor", "midbottom")
+        self.stale = set()
+        CellHashGroup.__init__(self, *sprites, **kwargs)
+
+    def remove_internal(self, sprite):
+        """Remove a sprite from the group and the spatial hash."""
+        CellHashGroup.remove_internal(self, sprite)
+        self.stale.discard(sprite)
+
+    def relocate(self, sprite):
+        """
+        Call after the hitbox of a sprite in the group has moved.  The
+        sprite is only re-bucketed if its hitbox now covers a different set
+        of cells; its draw rect is moved the next time the group syncs.
+        """
+        CellHashGroup.relocate(self, sprite)
+        self.stale.add(sprite)
+
+    def sync(self):
+        """Move the draw rects of all relocated sprites to their hitboxes."""
+        anchor = self.anchor
+        for sprite in self.stale:
+            setattr(sprite.rect, anchor, getattr(get_hitbox(sprite), anchor))
+        self.stale.clear()
+
+    def draw(self, surface):
+        """Sync the draw rects, then draw as a pg.sprite.Group does."""
+        self.sync()
+        return pg.sprite.Group.draw(self, surface)
@@ -0,0 +1,194 @@
+"""
+Compares four_dir_mask's collision response, now a single get_penetration
+query per obstacle hit, against the old approach: two finite differences of
+Mask.overlap_area (four calls) to find the direction of the collision, then
+backing out one pixel at a time with spritecollideany and collide_mask.
+
+The player is moved into the obstacles of the four_dir_mask level from
+every free position on a grid, in each direction, at a range of speeds.
+Final positions must be identical.  Reported directions are compared and the
+number of disagreements (hits on a corner, where either answer is fair) is
+printed along with the average cost of a colliding move at each speed.
+
+The new approach is not always faster.  Finding the direction costs about
+the same either way (a get_penetration call is an overlap mask, its count
+and three more overlap tests, against four overlap_area calls); the saving
+is in backing out, which the old approach does a pixel at a time.  At speed
+1 there is only ever one pixel to back out, so the two are level or the old
+approach wins, and at speed 3 (what four_dir_mask uses) the margin is small
+and can go either way from run to run.  The gain only shows reliably from a
+speed of about 6.  Skipping work for overlaps of only a pixel or two doesn't
+help, as the overlaps here are tens of pixels even at speed 1.  The cost of
+the direction query alone, and the speeds at which the new approach came out
+ahead, are printed as well.
+
+Runs headless; run it from within the four_direction_movement directory.
+"""
+
+import os
+import sys
+import timeit
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+import pygame as pg
+
+import four_dir_mask
+
+
+SPEEDS = (1, 3, 6, 12)
+REPEATS = 10
+
+
+def old_movement(player, obstacles, i):
+    """The original movement and pixel by pixel retreat of four_dir_mask."""
+    change = player.speed*four_dir_mask.DIRECT_DICT[player.direction][i]
+    player.rect[i] += change
+    collisions = pg.sprite.spritecollide(player, obstacles, False)
+    callback = pg.sprite.collide_mask
+    collide = pg.sprite.spritecollideany(player, collisions, callback)
+    if collide and not player.collision_direction:
+        player.collision_direction = old_direction(player, collide)
+    while collide:
+        player.rect[i] += (1 if change<0 else -1)
+        collide = pg.sprite.spritecollideany(player, collisions, callback)
+
+
+def old_direction(player, other_sprite):
+    """The original finite difference get_collision_direction."""
+    dx = finite_difference(player, other_sprite, 0, player.speed)
+    dy = finite_difference(player, other_sprite, 1, player.speed)
+    abs_x, abs_y = abs(dx), abs(dy)
+    if abs_x > abs_y:
+        return ("right" if dx>0 else "left")
+    elif abs_x < abs_y:
+        return ("bottom" if dy>0 else "top")
+    else:
+        return four_dir_mask.OPPOSITE_DICT[player.direction]
+
+
+def finite_difference(player, other_sprite, index, delta=1):
+    """Difference in overlap area with the offset moved by +/-delta."""
+    base_offset = [other_sprite.rect.x-player.rect.x,
+                   other_sprite.rect.y-player.rect.y]
+    offset_high = base_offset[:]
+    offset_low = base_offset[:]
+    offset_high[index] += delta
+    offset_low[index] -= delta
+    first_term = player.mask.overlap_area(other_sprite.mask, offset_high)
+    second_term = player.mask.overlap_area(other_sprite.mask, offset_low)
+    return first_term-second_term
+
+
+def time_directions(player, obstacles, cases):
+    """
+    Average cost of finding the direction of one collision with the old
+    finite differences and with get_penetration, for the given cases.
+    """
+    hits = []
+    for position, key, speed in cases:
+        vector = four_dir_mask.DIRECT_DICT[key]
+        rect = pg.Rect(position, player.rect.size)
+        player.rect = rect.move(vector[0]*speed, vector[1]*speed)
+        hit = pg.sprite.spritecollideany(player, obstacles,
+                                         pg.sprite.collide_mask)
+        hits.append((player.rect, hit, speed))
+    def old():
+        for rect, hit, speed in hits:
+            player.rect, player.speed = rect, speed
+            old_direction(player, hit)
+    def new():
+        for rect, hit, speed in hits:
+            offset = (hit.rect.x-rect.x, hit.rect.y-rect.y)
+            four_dir_mask.get_penetration(player.mask, hit.mask, offset,
+                                          player.mask_center)
+    times = []
+    for query in (old, new):
+        times.append(1e6*min(timeit.repeat(query, number=REPEATS, repeat=9))/
+                     REPEATS/len(hits))
+    return times
+
+
+def get_cases(player, obstacles):
+    """
+    Every (position, direction, speed) that starts clear of the obstacles
+    and ends up hitting one.
+    """
+    cases = []
+    for x in range(0, 451, 5):
+        for y in range(0, 451, 5):
+            player.rect.topleft = (x, y)
+            if pg.sprite.spritecollideany(player, obstacles,
+                                          pg.sprite.collide_mask):
+                continue
+            for key, vector in four_dir_mask.DIRECT_DICT.items():
+                for speed in SPEEDS:
+                    moved = player.rect.move(vector[0]*speed, vector[1]*speed)
+                    player.rect, start = moved, player.rect
+                    if pg.sprite.spritecollideany(player, obstacles,
+                                                  pg.sprite.collide_mask):
+                        cases.append(((x,y), key, speed))
+                    player.rect = start
+    return cases
+
+
+def run(player, obstacles, cases, move):
+    """Apply move to every case, returning the resulting rects and edges."""
+    results = []
+    for position, key, speed in cases:
+        player.rect.topleft = position
+        player.direction = key
+        player.speed = speed
+        player.collision_direction = None
+        axis = 0 if four_dir_mask.DIRECT_DICT[key][0] else 1
+        move(player, obstacles, axis)
+        results.append((player.rect.topleft, player.collision_direction))
+    return results
+
+
+def main():
+    pg.init()
+    pg.display.set_mode(four_dir_mask.SCREEN_SIZE)
+    sheet = pg.image.load("skelly.png").convert()
+    sheet.set_colorkey(four_dir_mask.COLOR_KEY)
+    four_dir_mask.SKEL_IMAGE = sheet
+    four_dir_mask.SHADE_MASK = pg.image.load("shader.png").convert_alpha()
+    control = four_dir_mask.Control()
+    player, obstacles = control.player, control.obstacles
+    cases = get_cases(player, obstacles)
+    old = run(player, obstacles, cases, old_movement)
+    new = run(player, obstacles, cases, four_dir_mask.Player.movement)
+    disagree = 0
+    for case, (old_rect, old_edge), (new_rect, new_edge) in zip(cases, old,
+                                                                 new):
+        if old_rect != new_rect:
+            message = "Mismatch for {}: {} != {}"
+            sys.exit(message.format(case, old_rect, new_rect))
+        disagree += old_edge != new_edge
+    print("{} colliding moves; final positions identical.".format(len(cases)))
+    print("Directions differ in {} (corner hits).".format(disagree))
+    print("  {:>6} {:>12} {:>12} {:>8} {:>14} {:>14}".format(
+          "speed", "old (us)", "new (us)", "old/new", "old dir (us)",
+          "new dir (us)"))
+    row = "  {:>6} {:>12.1f} {:>12.1f} {:>8.2f} {:>14.2f} {:>14.2f}"
+    faster, slower = [], []
+    for speed in SPEEDS:
+        subset = [case for case in cases if case[2] == speed]
+        times = []
+        for move in (old_movement, four_dir_mask.Player.movement):
+            timer = timeit.Timer(lambda: run(player, obstacles, subset, move))
+            times.append(1e6*min(timer.repeat(9, REPEATS))/REPEATS/
+                         len(subset))
+        times.append(times[0]/times[1])
+        times.extend(time_directions(player, obstacles, subset))
+        print(row.format(speed, *times))
+        if times[2] > 1:
+            faster.append(str(speed))
+        else:
+            slower.append(str(speed))
+    print("New approach faster at speeds: {}; not faster at: {}.".format(
+          ", ".join(faster) or "none", ", ".join(slower) or "none"))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
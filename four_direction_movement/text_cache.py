@@ -0,0 +1,256 @@
+"""
+A process wide cache of rendered text.  Surfaces are keyed by the font
+object (which fixes the typeface and size), antialiasing, color, background
+and the text itself, so the same string in two fonts or colors no longer
+shares one surface.  The least recently used surfaces are evicted once the
+cache holds more than its budget of pixel bytes, and hits, misses and
+evictions are counted.
+
+Text that changes every few frames (counters, scores, timers) would only
+churn the cache.  For such text get_glyphs returns a GlyphAtlas, which
+renders each character once and draws strings by blitting their glyphs, so
+no font.render call is made per new string.  Glyphs are placed by their
+advance, ignoring kerning, so pairs the font kerns may sit a pixel apart
+from font.render's output; digits and most short labels are unaffected.
+
+An atlas needs a background color: its glyphs are opaque, or colorkeyed on
+that color, so each is a plain copy to blit.  An atlas of per-pixel alpha
+glyphs was tried and is a loss, as alpha blending each glyph costs about as
+much as font.render does for a whole short string; drawing a new score took
+9.9, 12.7 and 27.1 us at 14, 30 and 60 pixels against 5.2, 9.4 and 22.9 us
+for font.render.  Even opaque glyphs only pay off for larger text; see the
+timings this module prints.
+
+Cached surfaces are shared; anything that wants to draw on one must copy it
+first.
+
+Run this module (from within the four_direction_movement directory) to time
+rendering a changing score with font.render, with the cache, and with a
+glyph atlas, and to print the cache's stats.
+"""
+
+import os
+import timeit
+import collections
+
+import pygame as pg
+
+
+BUDGET = 1024*1024 # Bytes of cached pixels.
+STRINGS = 5000
+SIZES = (14, 30, 60)
+
+
+def get_bytes(surface):
+    """The number of bytes of pixels surface holds."""
+    width, height = surface.get_size()
+    return width*height*surface.get_bytesize()
+
+
+class GlyphAtlas(object):
+    """
+    The glyphs of one font in one color on one background color, for
+    composing strings.  Glyphs are opaque, so blitting one is a plain copy.
+    With colorkey the background color is made transparent, so whatever the
+    text is drawn over shows through; antialiased edges are still blended
+    toward the background color, so colorkeyed text looks best without
+    antialiasing or over a similar color.
+    """
+    def __init__(self, font, color, background, antialias=True,
+                 colorkey=False):
+        self.font = font
+        self.color = color
+        self.background = background
+        self.antialias = antialias
+        self.colorkey = colorkey
+        self.glyphs = {}
+
+    def get(self, character):
+        """Return the surface of a single character, rendering it once."""
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            glyph = self.font.render(character, self.antialias, self.color,
+                                     self.background)
+            if pg.display.get_surface():
+                glyph = glyph.convert()
+            if self.colorkey:
+                glyph.set_colorkey(self.background, pg.RLEACCEL)
+            self.glyphs[character] = glyph
+        return glyph
+
+    def size(self, text):
+        """The (width, height) text will take up."""
+        width = sum(self.get(character).get_width() for character in text)
+        return width, self.font.get_height()
+
+    def draw(self, surface, text, pos):
+        """
+        Blit text to surface with its topleft at pos, with a single
+        Surface.blits call.  Returns the rect covered.
+        """
+        x, y = pos
+        blits = []
+        for character in text:
+            glyph = self.get(character)
+            blits.append((glyph, (x, y)))
+            x += glyph.get_width()
+        surface.blits(blits, doreturn=False)
+        return pg.Rect(pos, (x-pos[0], self.font.get_height()))
+
+    def render(self, text):
+        """Return a new surface of text, as font.render would."""
+        image = pg.Surface(self.size(text))
+        image.fill(self.background)
+        self.draw(image, text, (0, 0))
+        if self.colorkey:
+            image.set_colorkey(self.background)
+        return image
+
+    def get_bytes(self):
+        """Bytes of pixels held by the glyphs."""
+        return sum(get_bytes(glyph) for glyph in self.glyphs.values())
+
+
+class TextCache(object):
+    """A least recently used cache of rendered text with a byte budget."""
+    def __init__(self, budget=BUDGET):
+        self.budget = budget
+        self.surfaces = collections.OrderedDict()
+        self.atlases = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, color, antialias=True, background=None):
+        """
+        Equivalent to font.render(text, antialias, color, background), but
+        returns the cached surface if the same text has been rendered
+        recently.  Surfaces larger than the whole budget are not kept.
+        """
+        key = (font, antialias, tuple(color),
+               background and tuple(background), text)
+        image = self.surfaces.get(key)
+        if image is not None:
+            self.surfaces[key] = self.surfaces.pop(key) # Now most recent.
+            self.hits += 1
+            return image
+        self.misses += 1
+        if background is None:
+            image = font.render(text, antialias, color)
+        else:
+            image = font.render(text, antialias, color, background)
+        size = get_bytes(image)
+        if size <= self.budget:
+            self.surfaces[key] = image
+            self.bytes += size
+            while self.bytes > self.budget:
+                _, evicted = self.surfaces.popitem(last=False)
+                self.bytes -= get_bytes(evicted)
+                self.evictions += 1
+        return image
+
+    def get_glyphs(self, font, color, background, antialias=True,
+                   colorkey=False):
+        """
+        Return the (shared) GlyphAtlas for font in color on background,
+        which is required (see GlyphAtlas).
+        """
+        key = (font, antialias, tuple(color), tuple(background), colorkey)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            atlas = GlyphAtlas(font, color, background, antialias, colorkey)
+            self.atlases[key] = atlas
+        return atlas
+
+    def clear(self):
+        """Empty the cache and reset the stats."""
+        self.surfaces.clear()
+        self.atlases.clear()
+        self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def get_stats(self):
+        """
+        Return a dict of the hits, misses, evictions, the number of cached
+        surfaces, their bytes, and the bytes held by glyph atlases.
+        """
+        glyph_bytes = sum(atlas.get_bytes()
+                          for atlas in self.atlases.values())
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, surfaces=len(self.surfaces),
+                    bytes=self.bytes, glyph_bytes=glyph_bytes)
+
+    def get_report(self):
+        """A one line summary of the cache's stats."""
+        template = ("{hits} hits, {misses} misses, {evictions} evictions; "
+                    "{surfaces} surfaces: {kib:.1f} of {budget:.1f} KiB, "
+                    "glyphs {glyph_kib:.1f} KiB")
+        stats = self.get_stats()
+        return template.format(kib=stats["bytes"]/1024.0,
+                               budget=self.budget/1024.0,
+                               glyph_kib=stats["glyph_bytes"]/1024.0,
+                               **stats)
+
+
+TEXT_CACHE = TextCache()
+
+
+def main():
+    """
+    Draw STRINGS different scores, as a HUD counter would over a game,
+    with each method; then draw a few messages over and over through the
+    cache as four_dir_naive and four_dir_mask do.
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    screen = pg.display.set_mode((500, 500))
+    color, background = pg.Color("white"), pg.Color("black")
+    scores = ["Score: {}".format(i*37) for i in range(STRINGS)]
+    print("Time per new score string (us):")
+    print("  {:<22} {:>8} {:>8} {:>8}".format("font size", *SIZES))
+    rows = collections.OrderedDict()
+    for size in SIZES:
+        font = pg.font.SysFont("arial", size)
+        cache = TextCache()
+        opaque = cache.get_glyphs(font, color, background)
+        keyed = cache.get_glyphs(font, color, background, colorkey=True)
+        methods = [("font.render", lambda text: screen.blit(
+                        font.render(text, True, color), (0,0))),
+                   ("font.render opaque", lambda text: screen.blit(
+                        font.render(text, True, color, background), (0,0))),
+                   ("TextCache.render", lambda text: screen.blit(
+                        cache.render(font, text, color), (0,0))),
+                   ("opaque glyphs draw", lambda text: opaque.draw(screen,
+                                                                   text,
+                                                                   (0,0))),
+                   ("colorkey glyphs draw", lambda text: keyed.draw(screen,
+                                                                    text,
+                                                                    (0,0)))]
+        for name, draw in methods:
+            start = timeit.default_timer()
+            for text in scores:
+                draw(text)
+            elapsed = timeit.default_timer()-start
+            rows.setdefault(name, []).append(1e6*elapsed/STRINGS)
+    for name, times in rows.items():
+        print("  {:<22} {:>8.1f} {:>8.1f} {:>8.1f}".format(name, *times))
+    print("Cache at size {}: {}".format(SIZES[-1], cache.get_report()))
+    cache.clear()
+    messages = ["Collided with {} edge.".format(edge)
+                for edge in ("left", "right", "top", "bottom")]
+    methods = [("font.render", lambda text: font.render(text, True, color)),
+               ("TextCache.render", lambda text: cache.render(font, text,
+                                                              color))]
+    print("Time per repeated message at size {} (us):".format(SIZES[-1]))
+    for name, render in methods:
+        start = timeit.default_timer()
+        for i in range(STRINGS):
+            render(messages[i//60%4])
+        elapsed = timeit.default_timer()-start
+        print("  {:<22} {:>8.1f}".format(name, 1e6*elapsed/STRINGS))
+    print(cache.get_report())
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
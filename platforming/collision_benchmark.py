@@ -0,0 +1,200 @@
+"""
+Compares the collision resolution now used by Player.check_collisions against
+the old approach of backing out one pixel at a time, testing every nearby
+block at each step.  Players are dropped onto the floor of the fall_rect and
+fall_mask levels from a range of speeds; the final positions of both
+approaches are checked to be identical and the average cost per call is
+printed.  In fall_rect the old cost grows with the speed of the player while
+the new one, a single sweep through the obstacles' spatial hash, stays flat.
+In fall_mask landings are now looked up in the level's height field, which
+costs the same however far the player falls.  Players are only dropped from
+places they don't already overlap a block, as in play.
+
+As the new approaches find the first contact from the start of a move while
+the old one backed out from its end, fall_mask's player is also run through
+long random sessions alongside a player that still backs out a pixel at a
+time, and their positions are checked to match after every tick.
+
+Finally both samples drop a player from y=380 at a y_vel of 130 and throw one
+200 pixels at the right hand wall, with continuous collision on and off.
+With it on, neither move may pass through the floor or wall.
+
+Runs headless; run it from within the platforming directory.
+"""
+
+import os
+import sys
+import random
+import timeit
+import collections
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+import pygame as pg
+
+import fall_rect
+import fall_mask
+
+
+SPEEDS = (1, 5, 10, 25, 50, 100)
+REPEATS = 200
+SEEDS = (1, 2, 3)
+TICKS = 5000
+
+
+def pixel_step_rect(player, offset, index, obstacles):
+    """The original one pixel at a time resolution from fall_rect."""
+    unaltered = True
+    player.rect.move_ip(offset)
+    while pg.sprite.spritecollideany(player, obstacles):
+        player.rect[index] += (1 if offset[index]<0 else -1)
+        unaltered = False
+    return unaltered
+
+
+def pixel_step_mask(player, offset, index, obstacles):
+    """
+    The original one pixel at a time resolution from fall_mask.  Note that
+    only obstacles hit at the initial position are retested, so this could
+    leave the player overlapping a block it backed into; the new approach
+    does not, so such cases are skipped when comparing.
+    """
+    unaltered = True
+    player.rect.move_ip(offset)
+    collisions = pg.sprite.spritecollide(player, obstacles, False)
+    collidable = pg.sprite.collide_mask
+    while pg.sprite.spritecollideany(player, collisions, collidable):
+        player.rect[index] += (1 if offset[index]<0 else -1)
+        unaltered = False
+    return unaltered
+
+
+class PixelStepPlayer(fall_mask.Player):
+    """
+    fall_mask's player as it was before the height field and bisection,
+    backing out of the baked level mask one pixel at a time from the end of
+    each move.
+    """
+    def check_collisions(self, offset, index, level):
+        """The original one pixel at a time resolution."""
+        unaltered = True
+        self.rect.move_ip(offset)
+        while level.collide(self):
+            self.rect[index] += (1 if offset[index]<0 else -1)
+            unaltered = False
+        return unaltered
+
+
+def drop(player, speed, resolve):
+    """Put the player just above the floor and fall speed pixels into it."""
+    player.rect.bottom = 449
+    resolve((0,speed), 1)
+    return player.rect.topleft
+
+
+def compare(name, player, obstacles, pixel_step, level):
+    """
+    Check both approaches agree and print the cost of each.  The level
+    argument is whatever the sample's Player.check_collisions expects.
+    """
+    print("{}:".format(name))
+    print("  {:>6} {:>12} {:>12}".format("y_vel", "old (us)", "new (us)"))
+    def old(offset, index):
+        return pixel_step(player, offset, index, obstacles)
+    def new(offset, index):
+        return player.check_collisions(offset, index, level)
+    for speed in SPEEDS:
+        for x in range(50, 600, 7):
+            player.rect.x = x
+            player.rect.bottom = 449
+            if pg.sprite.spritecollideany(player, obstacles):
+                continue
+            expected = drop(player, speed, old)
+            collide_mask = pg.sprite.collide_mask
+            if pixel_step is pixel_step_mask and pg.sprite.spritecollideany(
+                    player, obstacles, collide_mask):
+                continue
+            result = drop(player, speed, new)
+            if expected != result:
+                message = "Mismatch at x={}, y_vel={}: {} != {}"
+                sys.exit(message.format(x, speed, expected, result))
+        player.rect.x = 300
+        times = []
+        for resolve in (old, new):
+            timer = timeit.Timer(lambda: drop(player, speed, resolve))
+            times.append(1e6*min(timer.repeat(3, REPEATS))/REPEATS)
+        print("  {:>6} {:>12.1f} {:>12.1f}".format(speed, *times))
+
+
+def compare_trajectories(level, location):
+    """
+    Run fall_mask's player and a pixel stepping player from location through
+    the same random input for TICKS physics ticks, once per seed, and check
+    they are in the same place after every tick.
+    """
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        new = fall_mask.Player(location, 4)
+        old = PixelStepPlayer(location, 4)
+        keys = collections.defaultdict(bool)
+        for tick in range(TICKS):
+            if tick%30 == 0:
+                keys.clear()
+                choice = rng.choice([pg.K_LEFT, pg.K_RIGHT, None])
+                if choice:
+                    keys[choice] = True
+                if rng.random() < 0.6:
+                    new.jump()
+                    old.jump()
+            new.update(level, keys)
+            old.update(level, keys)
+            if new.rect != old.rect:
+                message = "Trajectories differ at tick {}, seed {}: {} != {}"
+                sys.exit(message.format(tick, seed, new.rect, old.rect))
+    message = "fall_mask: trajectories identical over {} ticks for seeds {}"
+    print(message.format(TICKS, SEEDS))
+
+
+def check_tunnelling(module, level, player):
+    """
+    Make a fast fall and a fast sideways move with module.CONTINUOUS on and
+    off, printing where the player ends up; exit if it tunnels while on.
+    """
+    continuous = module.CONTINUOUS
+    for module.CONTINUOUS in (True, False):
+        player.rect.topleft = (100, 380)
+        player.check_collisions((0,130), 1, level)
+        player.rect.x = 560
+        y = player.rect.y
+        player.check_collisions((200,0), 0, level)
+        message = "{}: CONTINUOUS={}, fall ends at y={}, move at x={}"
+        print(message.format(module.__name__, module.CONTINUOUS, y,
+                             player.rect.x))
+        if module.CONTINUOUS and (y, player.rect.x) != (400, 600):
+            sys.exit("{} tunnelled".format(module.__name__))
+    module.CONTINUOUS = continuous
+
+
+def main():
+    pg.init()
+    pg.display.set_mode((700, 500))
+    shade = pg.image.load("shader.png").convert_alpha()
+    fall_rect.PLAYER_IMAGE = pg.image.load("smallface.png").convert_alpha()
+    fall_rect.SHADE_IMG = shade
+    fall_mask.PLAYER_IMAGE = fall_rect.PLAYER_IMAGE
+    fall_mask.SHADE_IMG = shade
+    control = fall_rect.Control()
+    compare("fall_rect", control.player, control.obstacles, pixel_step_rect,
+            control.obstacles)
+    check_tunnelling(fall_rect, control.obstacles, control.player)
+    control = fall_mask.Control()
+    for block in control.obstacles:
+        block.mask = pg.mask.from_surface(block.image)
+    compare("fall_mask", control.player, control.obstacles, pixel_step_mask,
+            control.level)
+    compare_trajectories(control.level, (100,380))
+    check_tunnelling(fall_mask, control.level, control.player)
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
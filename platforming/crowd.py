@@ -0,0 +1,293 @@
+"""
+Simulates a crowd of AI controlled actors in the fall_rect level using NumPy.
+Rather than one Player object per actor, positions, velocities and fall flags
+are stored in arrays (a structure of arrays) and gravity, movement and
+collision are applied to every actor at once with vectorized operations.
+
+Static obstacles are rasterized into an occupancy grid, so collision for every
+actor is a handful of array lookups.  Moves larger than a grid cell are split
+into cell sized steps, so unlike the pixel by pixel approach fast actors never
+tunnel through blocks.
+
+ActorView sprites give a per-actor view of the arrays for rendering.
+
+Requires NumPy.  Run from within the platforming directory:
+    python crowd.py --actors 500
+    python crowd.py --actors 10000 --headless --frames 600
+"""
+
+import os
+import sys
+import random
+import argparse
+import timeit
+
+import numpy as np
+import pygame as pg
+
+import fall_rect
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+
+
+CAPTION = "Basic Platforming: NumPy Crowd"
+SCREEN_SIZE = fall_rect.SCREEN_SIZE
+BACKGROUND_COLOR = fall_rect.BACKGROUND_COLOR
+
+
+class Crowd(object):
+    """
+    Physics for many actors stored as NumPy arrays.  The behaviour of each
+    actor matches fall_rect.Player (with the same speed, gravity and jump
+    power) given the same input.
+    """
+    def __init__(self, obstacles, locations, size, speed=4):
+        """
+        Obstacles is an iterable of static sprites; locations is a sequence
+        of (x,y) starting coordinates, one per actor; size is the (width,
+        height) of every actor.
+        """
+        self.speed = speed
+        self.grav = 0.22
+        self.jump_power = -8.5
+        self.size = size
+        self.make_grid(obstacles)
+        locations = np.array(locations, dtype=np.int64).reshape(-1, 2)
+        self.x = locations[:,0].copy()
+        self.y = locations[:,1].copy()
+        self.x_vel = np.zeros(len(self.x))
+        self.y_vel = np.zeros(len(self.x))
+        self.fall = np.zeros(len(self.x), dtype=bool)
+        self.direction = np.zeros(len(self.x), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.x)
+
+    def make_grid(self, obstacles):
+        """
+        Rasterize the obstacles into an occupancy grid. The cell size is the
+        largest that keeps every obstacle edge on a cell boundary. A summed
+        area table of the grid is kept so that the number of solid cells under
+        any rect can be found with four lookups.
+        """
+        rects = [obstacle.rect for obstacle in obstacles]
+        bounds = rects[0].unionall(rects)
+        self.origin = bounds.topleft
+        edges = [(rect.x-bounds.x, rect.y-bounds.y, rect.w, rect.h)
+                 for rect in rects]
+        self.cell_size = int(np.gcd.reduce(np.ravel(edges)))
+        cells = np.array(edges)//self.cell_size
+        grid = np.zeros((bounds.h//self.cell_size, bounds.w//self.cell_size),
+                        dtype=np.int32)
+        for x, y, w, h in cells:
+            grid[y:y+h, x:x+w] = 1
+        self.table = np.zeros((grid.shape[0]+1, grid.shape[1]+1), np.int32)
+        self.table[1:,1:] = grid.cumsum(0).cumsum(1)
+
+    def get_spans(self, x, y):
+        """Return the first and last grid rows and columns each rect covers."""
+        x = x-self.origin[0]
+        y = y-self.origin[1]
+        size = self.cell_size
+        return (y//size, (y+self.size[1]-1)//size,
+                x//size, (x+self.size[0]-1)//size)
+
+    def collide(self, x, y):
+        """Return which of the rects at x, y overlap a solid cell."""
+        top, bottom, left, right = self.get_spans(x, y)
+        rows, cols = self.table.shape[0]-1, self.table.shape[1]-1
+        top, bottom = np.clip(top, 0, rows), np.clip(bottom+1, 0, rows)
+        left, right = np.clip(left, 0, cols), np.clip(right+1, 0, cols)
+        table = self.table
+        solid = (table[bottom,right]-table[top,right]-
+                 table[bottom,left]+table[top,left])
+        return solid > 0
+
+    def set_intent(self, direction, jump):
+        """
+        Direction is an array of -1, 0 or 1 per actor (the held arrow keys);
+        jump is a boolean array of actors that pressed jump this frame.
+        """
+        self.direction[:] = direction
+        start = jump & ~self.fall
+        self.y_vel[start] = self.jump_power
+        self.fall |= start
+
+    def update(self):
+        """Equivalent of Player.update for every actor."""
+        self.x_vel = self.direction*self.speed
+        falling = self.fall.copy()
+        grounded = np.flatnonzero(~falling)
+        support = self.collide(self.x[grounded], self.y[grounded]+1)
+        self.fall[grounded[~support]] = True
+        moving = np.flatnonzero(falling)
+        blocked = self.move(moving, np.trunc(self.y_vel[moving]), 1)
+        self.fall[moving[blocked]] = False
+        moving = np.flatnonzero(self.x_vel)
+        self.move(moving, self.x_vel[moving], 0)
+        self.y_vel = np.where(self.fall, self.y_vel+self.grav, 0.0)
+
+    def move(self, indices, offsets, axis):
+        """
+        Move the actors at indices by offsets along axis (0 for x, 1 for y),
+        stopping flush against any solid cell in the way.  Offsets larger
+        than a cell are applied in cell sized steps.  Returns a boolean array
+        of which actors were blocked.
+        """
+        offsets = offsets.astype(np.int64)
+        blocked = np.zeros(len(indices), dtype=bool)
+        active = np.flatnonzero(offsets)
+        while len(active):
+            size = self.cell_size
+            step = np.clip(offsets[active], -size, size)
+            offsets[active] -= step
+            blocked[active] = self.step(indices[active], step, axis)
+            active = active[(offsets[active] != 0) & ~blocked[active]]
+        return blocked
+
+    def step(self, indices, step, axis):
+        """Move actors by up to one cell, snapping back out of solid cells."""
+        coords = self.y if axis else self.x
+        coords[indices] += step
+        hit = self.collide(self.x[indices], self.y[indices])
+        if hit.any():
+            hits = indices[hit]
+            spans = self.get_spans(self.x[hits], self.y[hits])
+            first, last = spans[:2] if axis else spans[2:]
+            size = self.cell_size
+            edge = np.where(step[hit] > 0, last*size-self.size[axis],
+                            (first+1)*size)
+            coords[hits] = edge+self.origin[axis]
+        return hit
+
+
+class ActorView(pg.sprite.Sprite):
+    """A sprite showing a single actor of a Crowd, for rendering."""
+    def __init__(self, crowd, index, image):
+        pg.sprite.Sprite.__init__(self)
+        self.crowd = crowd
+        self.index = index
+        self.image = image
+
+    @property
+    def rect(self):
+        """The actor's current rect, read from the crowd's arrays."""
+        x, y = self.crowd.x[self.index], self.crowd.y[self.index]
+        return pg.Rect((int(x), int(y)), self.crowd.size)
+
+
+class Control(object):
+    """Runs a crowd of randomly wandering actors in the fall_rect level."""
+    def __init__(self, actors):
+        self.screen = pg.display.get_surface()
+        self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
+        self.fps = 60.0
+        self.done = False
+        self.obstacles = fall_rect.Control.make_obstacles(self)
+        image = fall_rect.PLAYER_IMAGE
+        locations = self.spawn_locations(actors, image.get_size())
+        self.crowd = Crowd(self.obstacles, locations, image.get_size())
+        self.views = pg.sprite.Group([ActorView(self.crowd, i, image)
+                                      for i in range(actors)])
+
+    def spawn_locations(self, actors, size):
+        """Random, block free spots for the actors to start."""
+        rects = [obstacle.rect for obstacle in self.obstacles]
+        spots = [(x, y) for x in range(50, 650, 50) for y in range(50, 450, 50)
+                 if pg.Rect((x,y), size).collidelist(rects) == -1]
+        return [random.choice(spots) for _ in range(actors)]
+
+    def think(self):
+        """Very simple AI; each actor occasionally changes its mind."""
+        count = len(self.crowd)
+        change = np.random.random(count) < 1/60.0
+        direction = self.crowd.direction.copy()
+        direction[change] = np.random.randint(-1, 2, change.sum())
+        jump = np.random.random(count) < 1/90.0
+        self.crowd.set_intent(direction, jump)
+
+    def event_loop(self):
+        """We can always quit."""
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                self.done = True
+            elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                self.done = True
+
+    def update(self):
+        """Update every actor."""
+        self.think()
+        self.crowd.update()
+
+    def draw(self):
+        """Draw all necessary objects to the display surface."""
+        self.screen.fill(BACKGROUND_COLOR)
+        self.obstacles.draw(self.screen)
+        self.views.draw(self.screen)
+
+    def display_fps(self):
+        """Show the programs FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
+        pg.display.set_caption(caption)
+
+    def main_loop(self):
+        """As simple as it gets."""
+        while not self.done:
+            self.profiler.start_frame()
+            self.event_loop()
+            self.profiler.mark("events")
+            self.update()
+            self.profiler.mark("update")
+            self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
+            pg.display.update()
+            self.profiler.mark("display")
+            self.clock.tick(self.fps)
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
+
+    def benchmark(self, frames):
+        """Update without drawing; print the average time per update."""
+        start = timeit.default_timer()
+        for _ in range(frames):
+            self.update()
+        elapsed = timeit.default_timer()-start
+        message = "{} actors: {:.3f} ms per update ({:.0f} updates/second)"
+        print(message.format(len(self.crowd), 1000*elapsed/frames,
+                             frames/elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy platforming crowd.")
+    parser.add_argument("--actors", type=int, default=500)
+    parser.add_argument("--headless", action="store_true",
+                        help="benchmark updates without a window")
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args()
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    else:
+        os.environ['SDL_VIDEO_CENTERED'] = '1'
+    pg.init()
+    pg.display.set_caption(CAPTION)
+    pg.display.set_mode(SCREEN_SIZE)
+    fall_rect.PLAYER_IMAGE = pg.image.load("smallface.png").convert_alpha()
+    fall_rect.SHADE_IMG = pg.image.load("shader.png").convert_alpha()
+    run_it = Control(args.actors)
+    if args.headless:
+        run_it.benchmark(args.frames)
+    else:
+        run_it.main_loop()
+    pg.quit()
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Runs many independent headless episodes of a platforming sample across a
+pool of worker processes, for training and validating AI controllers.  Each
+worker has its own headless pygame (the SDL dummy video driver) and builds a
+fresh Control for every episode it is handed.  Per-episode metrics are
+collected, optionally written to a CSV file, and summarized along with the
+overall throughput.
+
+Input comes either from a headless.py key script (the same for every
+episode) or from a policy.  A policy is a class (or any callable) taking a
+random.Random seeded with the episode number, so episodes are reproducible.
+The object it returns is called once per frame with the episode's Control,
+and returns the keys to hold and whether to hold jump.  Policies are given
+as module:name and imported by each worker.
+
+The sample's images (shader.png and so on, see headless.IMAGES) are loaded
+once by the parent and their pixels copied into a block of shared memory.
+Workers wrap read-only views of that block in surfaces rather than loading
+and keeping their own copies.  The moving_platforms level draws its blocks
+with plain fills, so it has nothing to share; the fall_* samples do.
+
+Requires Python 3.8 or later.  Usage (from within the platforming directory):
+    python episode_runner.py --workers 4 --episodes 1000 --frames 3600
+    python episode_runner.py --script level.txt --csv episodes.csv
+    python episode_runner.py --policy episode_runner:Wander --level big.lvl
+    python episode_runner.py --sample fall_mask --episodes 200
+"""
+
+import os
+import csv
+import random
+import timeit
+import argparse
+import importlib
+import multiprocessing
+from multiprocessing import shared_memory
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+# SDL would otherwise turn the SIGTERM the pool ends its workers with into a
+# QUIT event, and the workers would never exit.
+os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+import pygame as pg
+
+import headless
+
+
+METRICS = ("episode", "frames", "seconds", "x", "y", "highest", "lowest",
+           "travelled", "airborne", "jumps")
+
+
+class Wander(object):
+    """
+    A very simple example policy; it walks one way, occasionally changes
+    its mind, and now and then holds jump for up to half a second.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.held = ()
+        self.jump = 0
+
+    def __call__(self, control):
+        if self.rng.random() < 1/60.0:
+            self.held = self.rng.choice(((), (pg.K_LEFT,), (pg.K_RIGHT,)))
+        if self.jump:
+            self.jump -= 1
+        elif self.rng.random() < 1/90.0:
+            self.jump = self.rng.randint(1, 30)
+        return self.held, self.jump > 0
+
+
+def load_policy(name):
+    """Import a policy given as module:name."""
+    module, attribute = name.split(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def policy_feed(control, policy, frames):
+    """
+    Yield (keys, events) for frames frames from a policy.  Space is pressed
+    when the policy starts holding jump and released when it stops.
+    """
+    jumping = False
+    for _ in range(frames):
+        held, jump = policy(control)
+        events = []
+        if jump and not jumping:
+            events.append(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE))
+        elif jumping and not jump:
+            events.append(pg.event.Event(pg.KEYUP, key=pg.K_SPACE))
+        jumping = jump
+        yield headless.ScriptedKeys(held), events
+
+
+def share_images(sample):
+    """
+    Copy the pixels of the sample's images into a new block of shared
+    memory.  Returns the SharedMemory and a list of (global name, offset,
+    size) for each image.
+    """
+    images = []
+    for global_name, filename in sorted(headless.IMAGES[sample].items()):
+        image = pg.image.load(filename)
+        images.append((global_name, image.get_size(),
+                       pg.image.tobytes(image, "RGBA")))
+    total = sum(len(pixels) for _, _, pixels in images)
+    memory = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    table = []
+    offset = 0
+    for global_name, size, pixels in images:
+        memory.buf[offset:offset+len(pixels)] = pixels
+        table.append((global_name, offset, size))
+        offset += len(pixels)
+    return memory, table
+
+
+class Worker(object):
+    """The state of one worker process; see init_worker."""
+    sample = None
+    memory = None
+    level = None
+    script = None
+    policy = None
+
+
+def init_worker(sample, memory_name, table, level, script, policy):
+    """
+    Set up pygame in a worker process and point the sample's image globals
+    at read-only surfaces over the shared memory.
+    """
+    pg.init()
+    Worker.sample = importlib.import_module(sample)
+    pg.display.set_mode(Worker.sample.SCREEN_SIZE)
+    Worker.memory = shared_memory.SharedMemory(name=memory_name)
+    for global_name, offset, size in table:
+        length = size[0]*size[1]*4
+        pixels = Worker.memory.buf[offset:offset+length].toreadonly()
+        image = pg.image.frombuffer(pixels, size, "RGBA")
+        setattr(Worker.sample, global_name, image)
+    Worker.level = level
+    Worker.script = script
+    Worker.policy = load_policy(policy) if policy else Wander
+
+
+def run_episode(task):
+    """Run one episode in a worker, returning a dict of its METRICS."""
+    episode, frames = task
+    if Worker.level:
+        control = Worker.sample.Control(Worker.level)
+    else:
+        control = Worker.sample.Control()
+    if Worker.script:
+        feed = headless.key_feed(Worker.script, frames)
+    else:
+        policy = Worker.policy(random.Random(episode))
+        feed = policy_feed(control, policy, frames)
+    player = control.player
+    metrics = dict(episode=episode, frames=0, travelled=0, airborne=0,
+                   jumps=0, highest=player.rect.y, lowest=player.rect.y)
+    start = timeit.default_timer()
+    for keys, events in feed:
+        for event in events:
+            pg.event.post(event)
+            if event.type == pg.KEYDOWN:
+                metrics["jumps"] += 1
+        x = player.rect.x
+        control.event_loop()
+        if control.done:
+            break
+        control.update(keys)
+        metrics["frames"] += 1
+        metrics["travelled"] += abs(player.rect.x-x)
+        metrics["airborne"] += bool(player.fall)
+        metrics["highest"] = min(metrics["highest"], player.rect.y)
+        metrics["lowest"] = max(metrics["lowest"], player.rect.y)
+    metrics["seconds"] = timeit.default_timer()-start
+    metrics["x"], metrics["y"] = player.rect.topleft
+    return metrics
+
+
+def run(args):
+    """Run the episodes, returning their metrics and the wall time taken."""
+    script = None
+    if args.script:
+        with open(args.script) as script_file:
+            script = headless.parse_script(script_file)
+    memory, table = share_images(args.sample)
+    # Spawned rather than forked workers each start their own SDL.
+    context = multiprocessing.get_context("spawn")
+    initargs = (args.sample, memory.name, table, args.level, script,
+                args.policy)
+    tasks = [(episode, args.frames) for episode in range(args.episodes)]
+    results = []
+    start = timeit.default_timer()
+    try:
+        with context.Pool(args.workers, init_worker, initargs) as pool:
+            for metrics in pool.imap_unordered(run_episode, tasks):
+                results.append(metrics)
+    finally:
+        memory.close()
+        memory.unlink()
+    elapsed = timeit.default_timer()-start
+    results.sort(key=lambda metrics: metrics["episode"])
+    return results, elapsed
+
+
+def write_csv(filename, results):
+    """Write the per-episode metrics to a CSV file."""
+    with open(filename, "w") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(METRICS)
+        for metrics in results:
+            writer.writerow([metrics[name] for name in METRICS])
+
+
+def summarize(results, elapsed, workers):
+    """Print the averages of the metrics and the overall throughput."""
+    frames = sum(metrics["frames"] for metrics in results)
+    print("{} episodes, {} frames on {} workers in {:.2f}s".format(
+          len(results), frames, workers, elapsed))
+    print("  {:.1f} episodes/second, {:.0f} frames/second".format(
+          len(results)/elapsed, frames/elapsed))
+    for name in METRICS[1:]:
+        mean = sum(metrics[name] for metrics in results)/float(len(results))
+        print("  mean {:<10} {:12.2f}".format(name, mean))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sample", default="moving_platforms",
+                        choices=sorted(headless.IMAGES))
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=3600,
+                        help="frames per episode")
+    parser.add_argument("--script", help="key script file (see headless.py)")
+    parser.add_argument("--policy", help="policy as module:name")
+    parser.add_argument("--level", help="level file for moving_platforms")
+    parser.add_argument("--csv", help="write per-episode metrics here")
+    args = parser.parse_args()
+    if args.level and args.sample != "moving_platforms":
+        parser.error("--level is only supported by moving_platforms")
+    pg.init()
+    results, elapsed = run(args)
+    pg.quit()
+    if args.csv:
+        write_csv(args.csv, results)
+    summarize(results, elapsed, args.workers)
+
+
+if __name__ == "__main__":
+    main()
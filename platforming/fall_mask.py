@@ -15,10 +15,25 @@ import sys
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from static_layer import MaskProfile, StaticLayer
+
 
 CAPTION = "Basic Platforming: Pixel Perfect Collision"
 SCREEN_SIZE = (700, 500)
 BACKGROUND_COLOR = (50, 50, 50)
+DIRTY_RECTS = True  #Only redraw and push the parts of the screen that change.
+#Events after which the whole screen must be redrawn, as the window's contents
+#may have been lost. The WINDOW* events only exist in pygame 2.
+REDRAW_EVENTS = (pg.VIDEOEXPOSE, getattr(pg, "WINDOWEXPOSED", pg.VIDEOEXPOSE),
+                 getattr(pg, "WINDOWRESTORED", pg.VIDEOEXPOSE))
+
+CONTINUOUS = True  #Sweep each move so fast players can't tunnel.
+
+TICK_RATE = 60.0  #Physics updates per second; independent of the frame rate.
+MAX_FRAME_TIME = 0.25  #Longest real time (seconds) simulated in one frame.
 
 
 class _Physics(object):
@@ -26,23 +41,27 @@ class _Physics(object):
     A simplified physics class. Using a 'real' gravity function here, though
     it is questionable whether or not it is worth the effort. Compare to the
     effect of gravity in fall_rect and decide for yourself.
+
+    Time is measured in fixed physics ticks rather than read from the clock,
+    so the result of a jump never depends on the frame rate. Whole ticks are
+    counted and converted to seconds, rather than tick lengths being summed,
+    so rounding error can't build up over a long fall.
     """
     def __init__(self):
         """You can experiment with different gravity here."""
         self.x_vel = self.y_vel = self.y_vel_i = 0
         self.grav = 20
         self.fall = False
-        self.time = None
+        self.time = self.ticks = None
 
     def physics_update(self):
         """If the player is falling, calculate current y velocity."""
         if self.fall:
-            time_now = pg.time.get_ticks()
-            if not self.time:
-                self.time = time_now
-            self.y_vel = self.grav*((time_now-self.time)/1000.0)+self.y_vel_i
+            self.ticks = 0 if self.ticks is None else self.ticks+1
+            self.time = self.ticks/TICK_RATE
+            self.y_vel = self.grav*self.time+self.y_vel_i
         else:
-            self.time = None
+            self.time = self.ticks = None
             self.y_vel = self.y_vel_i = 0
 
 
@@ -51,49 +70,51 @@ class Player(_Physics, pg.sprite.Sprite):
     def __init__(self,location,speed):
         """
         The location is an (x,y) coordinate pair, and speed is the player's
-        speed in pixels per frame. Speed should be an integer.
+        speed in pixels per physics tick. Speed should be an integer.
         """
         _Physics.__init__(self)
         pg.sprite.Sprite.__init__(self)
         self.image = PLAYER_IMAGE
         self.mask  = pg.mask.from_surface(self.image)
+        self.profile = MaskProfile(self.mask)
         self.speed = speed
         self.jump_power = 10
         self.rect = self.image.get_rect(topleft=location)
+        self.previous = self.rect.topleft
 
-    def get_position(self, obstacles):
+    def get_position(self, level):
         """Calculate the player's position this frame, including collisions."""
         if not self.fall:
-            self.check_falling(obstacles)
+            self.check_falling(level)
         else:
-            self.fall = self.check_collisions((0,self.y_vel), 1, obstacles)
+            self.fall = self.check_collisions((0,self.y_vel), 1, level)
         if self.x_vel:
-            self.check_collisions((self.x_vel,0), 0, obstacles)
-
-    def check_falling(self, obstacles):
-        """If player is not contacting the ground, enter fall state."""
-        self.rect.move_ip((0,1))
-        collisions = pg.sprite.spritecollide(self, obstacles, False)
-        collidable = pg.sprite.collide_mask
-        if not pg.sprite.spritecollideany(self, collisions, collidable):
+            self.check_collisions((self.x_vel,0), 0, level)
+
+    def check_falling(self, level):
+        """
+        If player is not contacting the ground, enter fall state. The level's
+        height field tells us if there is any room beneath us.
+        """
+        if level.get_clearance(self, 1):
             self.fall = True
-        self.rect.move_ip((0,-1))
 
-    def check_collisions(self, offset, index, obstacles):
+    def check_collisions(self, offset, index, level):
         """
         This function checks if a collision would occur after moving offset
-        pixels.  If a collision is detected position is decremented by one
-        pixel and retested. This continues until we find exactly how far we can
-        safely move, or we decide we can't move.
-        """
-        unaltered = True
-        self.rect.move_ip(offset)
-        collisions = pg.sprite.spritecollide(self, obstacles, False)
-        collidable = pg.sprite.collide_mask
-        while pg.sprite.spritecollideany(self, collisions, collidable):
-            self.rect[index] += (1 if offset[index]<0 else -1)
-            unaltered = False
-        return unaltered
+        pixels.  Vertically, the level's height field gives how far we can
+        move before touching the ground (or ceiling) directly.  Horizontally,
+        the level steps along the move no further than the thinnest block at
+        a time and bisects the first blocked step to find exactly how far we
+        can safely move.  With CONTINUOUS off, both axes just bisect between
+        where we are and where we would end up.  As the level's static
+        obstacles are baked into a single mask, each test is one overlap call
+        regardless of how many blocks are nearby.
+        """
+        distance = int(offset[index])
+        clearance = level.get_clearance(self, distance, index, CONTINUOUS)
+        self.rect[index] += clearance
+        return clearance == distance
 
     def check_keys(self, keys):
         """Find the player's self.x_vel based on currently held keys."""
@@ -109,15 +130,26 @@ class Player(_Physics, pg.sprite.Sprite):
             self.y_vel_i = -self.jump_power
             self.fall = True
 
-    def update(self, obstacles, keys):
-        """Everything we need to stay updated."""
+    def update(self, level, keys):
+        """
+        Everything we need to stay updated; called once per physics tick.
+        The level argument is the StaticLayer that the static obstacles have
+        been baked into.
+        """
+        self.previous = self.rect.topleft
         self.check_keys(keys)
-        self.get_position(obstacles)
+        self.get_position(level)
         self.physics_update()
 
-    def draw(self,surface):
-        """Blit the player to the target surface."""
-        surface.blit(self.image, self.rect)
+    def draw(self, surface, alpha=1.0):
+        """
+        Blit the player to the target surface, interpolated alpha of the way
+        from where it was on the previous physics tick to where it is now.
+        Returns the rect drawn.
+        """
+        x = self.previous[0]+(self.rect.x-self.previous[0])*alpha
+        y = self.previous[1]+(self.rect.y-self.previous[1])*alpha
+        return surface.blit(self.image, (x,y))
 
 
 class Block(pg.sprite.Sprite):
@@ -126,7 +158,6 @@ class Block(pg.sprite.Sprite):
         """The location argument is an (x,y) coordinate pair."""
         pg.sprite.Sprite.__init__(self)
         self.make_image()
-        self.mask = pg.mask.from_surface(self.image)
         self.rect = pg.Rect(location, (50,50))
 
     def make_image(self):
@@ -143,11 +174,16 @@ class Control(object):
         """Nothing to see here folks. Move along."""
         self.screen = pg.display.get_surface()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.keys = pg.key.get_pressed()
         self.done = False
         self.player = Player((50,-25), 4)
         self.obstacles = self.make_obstacles()
+        self.level = StaticLayer(self.obstacles)
+        self.background = self.make_background()
+        self.player_rect = None
+        self.pixels_pushed = 0
 
     def make_obstacles(self):
         """Adds some arbitrarily placed obstacles to a sprite.Group."""
@@ -168,32 +204,106 @@ class Control(object):
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_SPACE:
                     self.player.jump()
+            elif event.type in REDRAW_EVENTS:
+                self.player_rect = None
 
-    def update(self):
-        """Update held keys and the player."""
-        self.keys = pg.key.get_pressed()
-        self.player.update(self.obstacles, self.keys)
+    def update(self, keys=None):
+        """
+        Update held keys and the player. If keys is given it is used in place
+        of the keyboard state (see headless.py).
+        """
+        self.keys = pg.key.get_pressed() if keys is None else keys
+        self.player.update(self.level, self.keys)
 
-    def draw(self):
-        """Draw all necessary objects to the display surface."""
-        self.screen.fill(BACKGROUND_COLOR)
-        self.obstacles.draw(self.screen)
-        self.player.draw(self.screen)
+    def draw(self, alpha=1.0):
+        """
+        Draw all necessary objects to the display surface. Alpha is how far
+        we are between the last two physics ticks (see Player.draw). With
+        DIRTY_RECTS, only the area the player was drawn to last frame is
+        restored from the cached background before drawing the player again.
+        Returns a list of the rects changed, or None if the whole screen was
+        redrawn.  The whole screen is redrawn on the first frame and whenever
+        the window has been exposed or restored (see event_loop).
+        """
+        if not DIRTY_RECTS or self.player_rect is None:
+            self.screen.blit(self.background, (0,0))
+            self.player_rect = self.player.draw(self.screen, alpha)
+            return None
+        changed = [self.player_rect]
+        self.screen.blit(self.background, self.player_rect, self.player_rect)
+        self.player_rect = self.player.draw(self.screen, alpha)
+        changed.append(self.player_rect)
+        return changed
+
+    def make_background(self):
+        """Render the background and the static obstacles once."""
+        background = pg.Surface(self.screen.get_size()).convert()
+        background.fill(BACKGROUND_COLOR)
+        self.obstacles.draw(background)
+        return background
+
+    def present(self, changed):
+        """
+        Push the changed rects to the display; all of it if changed is None.
+        Overlapping rects (such as where the player was and where it is now)
+        are merged first, so no pixel is pushed twice. The number of pixels
+        pushed is recorded for display.
+        """
+        if changed is None:
+            pg.display.update()
+            width, height = self.screen.get_size()
+            self.pixels_pushed = width*height
+        else:
+            merged = []
+            for rect in changed:
+                rect = pg.Rect(rect)
+                hit = rect.collidelist(merged)
+                while hit != -1:
+                    rect.union_ip(merged.pop(hit))
+                    hit = rect.collidelist(merged)
+                merged.append(rect)
+            pg.display.update(merged)
+            self.pixels_pushed = sum(rect.w*rect.h for rect in merged)
 
     def display_fps(self):
-        """Show the programs FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the FPS, pixels pushed and frame times in the window."""
+        template = "{} - FPS: {:.2f} - Pixels pushed: {} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.pixels_pushed,
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
-        """As simple as it gets."""
+        """
+        Physics runs at a fixed TICK_RATE while drawing runs at up to
+        self.fps. Real time is accumulated each frame and as many physics
+        ticks are run as fit within it, so a slow frame is caught up on
+        rather than slowing the simulation down. The remainder is used to
+        interpolate the player's drawn position.
+        """
+        tick_length = 1.0/TICK_RATE
+        accumulator = 0.0
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
-            self.update()
-            self.draw()
-            pg.display.update()
-            self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("events")
+            elapsed = self.clock.tick(self.fps)/1000.0
+            self.profiler.mark("tick")
+            accumulator += min(elapsed, MAX_FRAME_TIME)
+            while accumulator >= tick_length:
+                self.update()
+                accumulator -= tick_length
+            self.profiler.mark("update")
+            changed = self.draw(accumulator/tick_length)
+            overlay = self.profiler.draw_overlay(self.screen)
+            if overlay and changed is not None:
+                changed.append(overlay)
+            self.profiler.mark("draw")
+            self.present(changed)
+            self.profiler.mark("display")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 if __name__ == "__main__":
@@ -11,10 +11,21 @@ import sys
 import random
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from spatial import SpatialGroup
+
 
 CAPTION = "Basic Platforming: Rectangle Collision"
 SCREEN_SIZE = (700, 500)
 BACKGROUND_COLOR = (50, 50, 50)
+DIRTY_RECTS = True  #Only redraw and push the parts of the screen that change.
+#Events after which the whole screen must be redrawn, as the window's contents
+#may have been lost. The WINDOW* events only exist in pygame 2.
+REDRAW_EVENTS = (pg.VIDEOEXPOSE, getattr(pg, "WINDOWEXPOSED", pg.VIDEOEXPOSE),
+                 getattr(pg, "WINDOWRESTORED", pg.VIDEOEXPOSE))
+CONTINUOUS = True  #Sweep each move so fast players can't tunnel.
 
 
 class _Physics(object):
@@ -64,16 +75,57 @@ class Player(_Physics, pg.sprite.Sprite):
         self.rect.move_ip((0,-1))
 
     def check_collisions(self, offset, index, obstacles):
+        """
+        Move offset pixels, stopping flush against any obstacle in the way.
+        Returns True if the move was unobstructed.
+        """
+        if CONTINUOUS:
+            return self.sweep(offset, index, obstacles)
+        return self.check_destination(offset, index, obstacles)
+
+    def sweep(self, offset, index, obstacles):
+        """
+        Cast the leading edge of our rect along the move through the
+        obstacles' spatial hash and move straight to the time of impact.
+        Unlike checking the destination, a platform thinner than the move
+        can't be skipped over however fast we fall.
+        """
+        distance = int(offset[index])
+        time, hits = obstacles.sweep(self.rect, distance, index)
+        self.rect[index] += int(round(time*distance))
+        return not hits
+
+    def check_destination(self, offset, index, obstacles):
         """This function checks if a collision would occur after moving offset
-        pixels.  If a collision is detected position is decremented by one
-        pixel and retested. This continues until we find exactly how far we can
-        safely move, or we decide we can't move."""
-        unaltered = True
+        pixels.  If a collision is detected, rather than backing out one pixel
+        at a time, the player is placed flush against the obstacles it overlaps
+        and retested. Only obstacles touching the swept area are considered
+        unless we get pushed back past where we started. The result is
+        identical to the pixel by pixel approach, but the cost no longer grows
+        with our speed."""
+        start = self.rect.copy()
         self.rect.move_ip(offset)
-        while pg.sprite.spritecollideany(self, obstacles):
-            self.rect[index] += (1 if offset[index]<0 else -1)
-            unaltered = False
-        return unaltered
+        if not pg.sprite.spritecollideany(self, obstacles):
+            return True
+        swept = self.rect.union(start)
+        nearby = [sprite for sprite in obstacles if swept.colliderect(sprite)]
+        hits = [sprite for sprite in nearby if self.rect.colliderect(sprite)]
+        while hits:
+            self.rect[index] = self.flush_position(hits, offset, index)
+            if not swept.contains(self.rect):
+                nearby = obstacles
+            hits = [hit for hit in nearby if self.rect.colliderect(hit)]
+        return False
+
+    def flush_position(self, hits, offset, index):
+        """
+        Find the position along index that places the player against the far
+        side of every obstacle in hits, opposite to the direction of offset.
+        """
+        if offset[index] < 0:
+            return max(hit.rect[index]+hit.rect.size[index] for hit in hits)
+        else:
+            return min(hit.rect[index] for hit in hits)-self.rect.size[index]
 
     def check_keys(self, keys):
         """Find the player's self.x_vel based on currently held keys."""
@@ -96,8 +148,8 @@ class Player(_Physics, pg.sprite.Sprite):
         self.physics_update()
 
     def draw(self,surface):
-        """Blit the player to the target surface."""
-        surface.blit(self.image, self.rect)
+        """Blit the player to the target surface and return the rect drawn."""
+        return surface.blit(self.image, self.rect)
 
 
 class Block(pg.sprite.Sprite):
@@ -122,14 +174,18 @@ class Control(object):
         """Nothing to see here folks. Move along."""
         self.screen = pg.display.get_surface()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.keys = pg.key.get_pressed()
         self.done = False
         self.player = Player((50,-25), 4)
         self.obstacles = self.make_obstacles()
+        self.background = self.make_background()
+        self.player_rect = None
+        self.pixels_pushed = 0
 
     def make_obstacles(self):
-        """Adds some arbitrarily placed obstacles to a sprite.Group."""
+        """Adds some arbitrarily placed obstacles to a SpatialGroup."""
         obstacles = [Block((400,400)), Block((300,270)), Block((150,170))]
         obstacles += [Block((500+50*i,220)) for i in range(3)]
         for i in range(12):
@@ -137,7 +193,7 @@ class Control(object):
             obstacles.append(Block((100+i*50,0)))
             obstacles.append(Block((0,50*i)))
             obstacles.append(Block((650,50*i)))
-        return pg.sprite.Group(obstacles)
+        return SpatialGroup(obstacles, cell_size=100)
 
     def event_loop(self):
         """We can always quit, and the player can sometimes jump."""
@@ -147,32 +203,94 @@ class Control(object):
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_SPACE:
                     self.player.jump()
+            elif event.type in REDRAW_EVENTS:
+                self.player_rect = None
 
-    def update(self):
-        """Update held keys and the player."""
-        self.keys = pg.key.get_pressed()
+    def update(self, keys=None):
+        """
+        Update held keys and the player. If keys is given it is used in place
+        of the keyboard state (see headless.py).
+        """
+        self.keys = pg.key.get_pressed() if keys is None else keys
         self.player.update(self.obstacles, self.keys)
 
     def draw(self):
-        """Draw all necessary objects to the display surface."""
-        self.screen.fill(BACKGROUND_COLOR)
-        self.obstacles.draw(self.screen)
-        self.player.draw(self.screen)
+        """
+        Draw all necessary objects to the display surface. With DIRTY_RECTS,
+        only the area the player was drawn to last frame is restored from the
+        cached background before drawing the player again. Returns a list of
+        the rects changed, or None if the whole screen was redrawn.  The
+        whole screen is redrawn on the first frame and whenever the window
+        has been exposed or restored (see event_loop).
+        """
+        if not DIRTY_RECTS or self.player_rect is None:
+            self.screen.blit(self.background, (0,0))
+            self.player_rect = self.player.draw(self.screen)
+            return None
+        changed = [self.player_rect]
+        self.screen.blit(self.background, self.player_rect, self.player_rect)
+        self.player_rect = self.player.draw(self.screen)
+        changed.append(self.player_rect)
+        return changed
+
+    def make_background(self):
+        """Render the background and the static obstacles once."""
+        background = pg.Surface(self.screen.get_size()).convert()
+        background.fill(BACKGROUND_COLOR)
+        self.obstacles.draw(background)
+        return background
+
+    def present(self, changed):
+        """
+        Push the changed rects to the display; all of it if changed is None.
+        Overlapping rects (such as where the player was and where it is now)
+        are merged first, so no pixel is pushed twice. The number of pixels
+        pushed is recorded for display.
+        """
+        if changed is None:
+            pg.display.update()
+            width, height = self.screen.get_size()
+            self.pixels_pushed = width*height
+        else:
+            merged = []
+            for rect in changed:
+                rect = pg.Rect(rect)
+                hit = rect.collidelist(merged)
+                while hit != -1:
+                    rect.union_ip(merged.pop(hit))
+                    hit = rect.collidelist(merged)
+                merged.append(rect)
+            pg.display.update(merged)
+            self.pixels_pushed = sum(rect.w*rect.h for rect in merged)
 
     def display_fps(self):
-        """Show the programs FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the FPS, pixels pushed and frame times in the window."""
+        template = "{} - FPS: {:.2f} - Pixels pushed: {} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.pixels_pushed,
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """As simple as it gets."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
-            self.draw()
-            pg.display.update()
+            self.profiler.mark("update")
+            changed = self.draw()
+            overlay = self.profiler.draw_overlay(self.screen)
+            if overlay and changed is not None:
+                changed.append(overlay)
+            self.profiler.mark("draw")
+            self.present(changed)
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 if __name__ == "__main__":
@@ -8,109 +8,206 @@ for times when you find rotation is too expensive to repeat.
 
 import os
 import sys
+import math
 import random
+import threading
+import collections
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from static_layer import MaskProfile, StaticLayer
+
 
 CAPTION = "Basic Platforming: Rotating our face"
 SCREEN_SIZE = (700, 500)
 BACKGROUND_COLOR = (50, 50, 50)
 
+CONTINUOUS = True  #Sweep each move so fast players can't tunnel.
+
+TICK_RATE = 60.0  #Physics updates per second; independent of the frame rate.
+MAX_FRAME_TIME = 0.25  #Longest real time (seconds) simulated in one frame.
+
+ROTATION_STEP = 1  #Angles are rounded to a multiple of this many degrees.
+ROTATION_CACHE_SIZE = None  #Max number of cached images; None for unbounded.
+PREWARM = None  #One of None, "startup", or "thread".
+
 
 class _Physics(object):
     """
     A simplified physics class. Using a 'real' gravity function here, though
     it is questionable whether or not it is worth the effort. Compare to the
     effect of gravity in fall_rect and decide for yourself.
+
+    Time is measured in fixed physics ticks rather than read from the clock,
+    so the result of a jump never depends on the frame rate. Whole ticks are
+    counted and converted to seconds, rather than tick lengths being summed,
+    so rounding error can't build up over a long fall.
     """
     def __init__(self):
         """You can experiment with different gravity here."""
         self.x_vel = self.y_vel = self.y_vel_i = 0
         self.grav = 20
         self.fall = False
-        self.time = None
+        self.time = self.ticks = None
 
     def physics_update(self):
         """If the player is falling, calculate current y velocity."""
         if self.fall:
-            time_now = pg.time.get_ticks()
-            if not self.time:
-                self.time = time_now
-            self.y_vel = self.grav*((time_now-self.time)/1000.0)+self.y_vel_i
+            self.ticks = 0 if self.ticks is None else self.ticks+1
+            self.time = self.ticks/TICK_RATE
+            self.y_vel = self.grav*self.time+self.y_vel_i
         else:
-            self.time = None
+            self.time = self.ticks = None
             self.y_vel = self.y_vel_i = 0
 
 
+class RotationCache(object):
+    """
+    Caches rotated images of the player so that identical rotations are only
+    performed once. Angles are quantized to a multiple of step degrees. If
+    max_images is given, the least recently used image is evicted when the
+    cache is full. The hits, misses and evictions counters may be read at any
+    time.
+    """
+    def __init__(self, step=1, max_images=None):
+        self.step = step
+        self.max_images = max_images
+        self.images = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.worker = None
+
+    def quantize(self, angle):
+        """Round angle to the nearest multiple of step, in range [0, 360)."""
+        return int(round(angle/float(self.step)))*self.step%360
+
+    def get(self, angle):
+        """Return the image for angle, rendering it if it is not cached."""
+        key = self.quantize(angle)
+        with self.lock:
+            if key in self.images:
+                self.hits += 1
+                self.images[key] = image = self.images.pop(key)
+                return image
+            self.misses += 1
+        return self.store(key, self.render(key))
+
+    def render(self, angle):
+        """Rotate the face and blit it onto the base image."""
+        image = pg.Surface(BASEFACE.get_size()).convert_alpha()
+        image_rect = image.get_rect()
+        image.fill((0,0,0,0))
+        image.blit(BASEFACE, (0,0))
+        face = pg.transform.rotozoom(FACE, angle, 1)
+        face_rect = face.get_rect(center=image_rect.center)
+        image.blit(face, face_rect)
+        return image
+
+    def store(self, key, image):
+        """
+        Add an image to the cache, evicting the oldest if necessary, and
+        return it.  If another thread cached the same key first its image
+        is kept and returned instead.
+        """
+        with self.lock:
+            if key in self.images:
+                return self.images[key]
+            self.images[key] = image
+            if self.max_images and len(self.images) > self.max_images:
+                self.images.popitem(last=False)
+                self.evictions += 1
+            return image
+
+    def prewarm(self, threaded=False):
+        """
+        Render every quantized angle (up to max_images of them) ahead of time.
+        If threaded is True this is done lazily on a daemon worker thread and
+        this method returns immediately; otherwise it blocks until done.
+        """
+        if threaded:
+            self.worker = threading.Thread(target=self.prewarm)
+            self.worker.daemon = True
+            self.worker.start()
+        else:
+            count = int(math.ceil(360.0/self.step))
+            if self.max_images:
+                count = min(count, self.max_images)
+            for i in range(count):
+                angle = i*self.step%360
+                with self.lock:
+                    cached = angle in self.images
+                if not cached:
+                    self.store(angle, self.render(angle))
+
+    def get_stats(self):
+        """Return a dictionary of the cache's current counters."""
+        with self.lock:
+            return {"hits" : self.hits, "misses" : self.misses,
+                    "evictions" : self.evictions, "size" : len(self.images)}
+
+
 class Player(_Physics, pg.sprite.Sprite):
     """Class representing our player."""
-    rotation_cache = {}
+    rotation_cache = RotationCache(ROTATION_STEP, ROTATION_CACHE_SIZE)
 
     def __init__(self, location, speed):
         """
         The location is an (x,y) coordinate pair, and speed is the player's
-        speed in pixels per frame.  Speed should be an integer.
+        speed in pixels per physics tick.  Speed should be an integer.
         """
         _Physics.__init__(self)
         pg.sprite.Sprite.__init__(self)
         self.angle = 0
         self.rect = BASEFACE.get_rect(topleft=location)
+        self.previous = self.rect.topleft
         self.image = self.make_image()
         self.mask  = pg.mask.from_surface(BASEFACE)
+        self.profile = MaskProfile(self.mask)
         self.speed = speed
         self.jump_power = 10
 
     def make_image(self):
         """
-        Rotate the player's image and cache the surface so that we don't
+        Get the player's rotated image from the cache so that we don't
         need to perform identical rotations more than once.
         """
-        if self.angle in Player.rotation_cache:
-            image = Player.rotation_cache[self.angle]
-        else:
-            image = pg.Surface((self.rect.size)).convert_alpha()
-            image_rect = image.get_rect()
-            image.fill((0,0,0,0))
-            image.blit(BASEFACE, (0,0))
-            face = pg.transform.rotozoom(FACE, self.angle, 1)
-            face_rect = face.get_rect(center=image_rect.center)
-            image.blit(face, face_rect)
-            Player.rotation_cache[self.angle] = image
-        return image
+        return Player.rotation_cache.get(self.angle)
 
-    def get_position(self, obstacles):
+    def get_position(self, level):
         """Calculate the player's position this frame, including collisions."""
         if not self.fall:
-            self.check_falling(obstacles)
+            self.check_falling(level)
         else:
-            self.fall = self.check_collisions((0,self.y_vel), 1, obstacles)
+            self.fall = self.check_collisions((0,self.y_vel), 1, level)
         if self.x_vel:
-            self.check_collisions((self.x_vel,0), 0, obstacles)
-
-    def check_falling(self, obstacles):
-        """If player is not contacting the ground, enter fall state."""
-        self.rect.move_ip((0,1))
-        collisions = pg.sprite.spritecollide(self, obstacles, False)
-        collidable = pg.sprite.collide_mask
-        if not pg.sprite.spritecollideany(self, collisions, collidable):
+            self.check_collisions((self.x_vel,0), 0, level)
+
+    def check_falling(self, level):
+        """
+        If player is not contacting the ground, enter fall state. The level's
+        height field tells us if there is any room beneath us.
+        """
+        if level.get_clearance(self, 1):
             self.fall = True
-        self.rect.move_ip((0,-1))
 
-    def check_collisions(self, offset, index, obstacles):
+    def check_collisions(self, offset, index, level):
         """
         This function checks if a collision would occur after moving offset
-        pixels.  If a collision is detected position is decremented by one
-        pixel and retested. This continues until we find exactly how far we can
-        safely move, or we decide we can't move.
-        """
-        unaltered = True
-        self.rect.move_ip(offset)
-        collisions = pg.sprite.spritecollide(self, obstacles, False)
-        collidable = pg.sprite.collide_mask
-        while pg.sprite.spritecollideany(self, collisions, collidable):
-            self.rect[index] += (1 if offset[index]<0 else -1)
-            unaltered = False
-        return unaltered
+        pixels.  Vertically, the level's height field gives how far we can
+        move before touching the ground (or ceiling) directly.  Horizontally,
+        the level steps along the move no further than the thinnest block at
+        a time and bisects the first blocked step to find exactly how far we
+        can safely move.  With CONTINUOUS off, both axes just bisect between
+        where we are and where we would end up.  As the level's static
+        obstacles are baked into a single mask, each test is one overlap call
+        regardless of how many blocks are nearby.
+        """
+        distance = int(offset[index])
+        clearance = level.get_clearance(self, distance, index, CONTINUOUS)
+        self.rect[index] += clearance
+        return clearance == distance
 
     def check_keys(self, keys):
         """Find the player's self.x_vel based on currently held keys."""
@@ -132,16 +229,27 @@ class Player(_Physics, pg.sprite.Sprite):
             self.y_vel_i = -self.jump_power
             self.fall = True
 
-    def update(self, obstacles, keys):
-        """Everything we need to stay updated."""
+    def update(self, level, keys):
+        """
+        Everything we need to stay updated; called once per physics tick.
+        The level argument is the StaticLayer that the static obstacles have
+        been baked into.
+        """
+        self.previous = self.rect.topleft
         self.check_keys(keys)
-        self.get_position(obstacles)
+        self.get_position(level)
         self.physics_update()
         self.rotate()
 
-    def draw(self, surface):
-        """Blit the player to the target surface."""
+    def draw(self, surface, alpha=1.0):
+        """
+        Blit the player to the target surface, interpolated alpha of the way
+        from where it was on the previous physics tick to where it is now.
+        """
+        x = self.previous[0]+(self.rect.x-self.previous[0])*alpha
+        y = self.previous[1]+(self.rect.y-self.previous[1])*alpha
         blit_rect = self.image.get_rect(center=self.rect.center)
+        blit_rect.move_ip(x-self.rect.x, y-self.rect.y)
         surface.blit(self.image, blit_rect)
 
 
@@ -151,7 +259,6 @@ class Block(pg.sprite.Sprite):
         """The location argument is an (x,y) coordinate pair."""
         pg.sprite.Sprite.__init__(self)
         self.make_image()
-        self.mask = pg.mask.from_surface(self.image)
         self.rect = pg.Rect(location, (50,50))
 
     def make_image(self):
@@ -168,11 +275,13 @@ class Control(object):
         """Nothing to see here folks. Move along."""
         self.screen = pg.display.get_surface()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.keys = pg.key.get_pressed()
         self.done = False
         self.player = Player((50,-25), 4)
         self.obstacles = self.make_obstacles()
+        self.level = StaticLayer(self.obstacles)
 
     def make_obstacles(self):
         """Adds some arbitrarily placed obstacles to a sprite.Group."""
@@ -194,31 +303,61 @@ class Control(object):
                 if event.key == pg.K_SPACE:
                     self.player.jump()
 
-    def update(self):
-        """Update held keys and the player."""
-        self.keys = pg.key.get_pressed()
-        self.player.update(self.obstacles, self.keys)
+    def update(self, keys=None):
+        """
+        Update held keys and the player. If keys is given it is used in place
+        of the keyboard state (see headless.py).
+        """
+        self.keys = pg.key.get_pressed() if keys is None else keys
+        self.player.update(self.level, self.keys)
 
-    def draw(self):
-        """Draw all necessary objects to the display surface."""
+    def draw(self, alpha=1.0):
+        """
+        Draw all necessary objects to the display surface. Alpha is how far
+        we are between the last two physics ticks (see Player.draw).
+        """
         self.screen.fill(BACKGROUND_COLOR)
         self.obstacles.draw(self.screen)
-        self.player.draw(self.screen)
+        self.player.draw(self.screen, alpha)
 
     def display_fps(self):
-        """Show the programs FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the FPS, rotation cache stats and frame times in the window."""
+        stats = Player.rotation_cache.get_stats()
+        template = ("{} - FPS: {:.2f} - Cache: {hits}/{misses}/{evictions}"
+                    " - {}")
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary(), **stats)
         pg.display.set_caption(caption)
 
     def main_loop(self):
-        """As simple as it gets."""
+        """
+        Physics runs at a fixed TICK_RATE while drawing runs at up to
+        self.fps. Real time is accumulated each frame and as many physics
+        ticks are run as fit within it, so a slow frame is caught up on
+        rather than slowing the simulation down. The remainder is used to
+        interpolate the player's drawn position.
+        """
+        tick_length = 1.0/TICK_RATE
+        accumulator = 0.0
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
-            self.update()
-            self.draw()
+            self.profiler.mark("events")
+            elapsed = self.clock.tick(self.fps)/1000.0
+            self.profiler.mark("tick")
+            accumulator += min(elapsed, MAX_FRAME_TIME)
+            while accumulator >= tick_length:
+                self.update()
+                accumulator -= tick_length
+            self.profiler.mark("update")
+            self.draw(accumulator/tick_length)
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
-            self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("display")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 if __name__ == "__main__":
@@ -229,6 +368,8 @@ if __name__ == "__main__":
     BASEFACE = pg.image.load("base_face.png").convert_alpha()
     FACE  = pg.image.load("just_face.png").convert_alpha()
     SHADE_IMG = pg.image.load("shader.png").convert_alpha()
+    if PREWARM:
+        Player.rotation_cache.prewarm(threaded=(PREWARM == "thread"))
     run_it = Control()
     run_it.main_loop()
     pg.quit()
@@ -0,0 +1,150 @@
+"""
+Runs one of the platforming samples headless, as fast as possible, for
+soak-testing level logic.  The SDL dummy video driver is used; nothing is drawn
+or presented and the frame rate is not capped.  Each frame the scripted key
+state is handed to Control.update, and scripted key presses are posted to the
+event queue so that Control.event_loop handles them exactly as it would real
+ones.
+
+A script is a text file with one segment per line, for example:
+    60 right
+    30 right jump
+    90 left
+Each segment holds the listed keys (left, right) for the given number of
+frames.  A segment with "jump" presses space on its first frame and releases
+it on its last.  The script is repeated until the requested number of frames
+have been simulated.
+
+Usage (from within the platforming directory):
+    python headless.py moving_platforms --frames 1000000 --script level.txt
+
+Note that samples whose physics read pg.time.get_ticks() will behave
+differently when run faster than real time.
+"""
+
+import os
+import timeit
+import argparse
+import importlib
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+import pygame as pg
+
+
+IMAGES = {"fall_rect" : {"PLAYER_IMAGE" : "smallface.png",
+                         "SHADE_IMG" : "shader.png"},
+          "fall_mask" : {"PLAYER_IMAGE" : "smallface.png",
+                         "SHADE_IMG" : "shader.png"},
+          "fall_rotate" : {"BASEFACE" : "base_face.png",
+                           "FACE" : "just_face.png",
+                           "SHADE_IMG" : "shader.png"},
+          "moving_platforms" : {},
+          "moving_platforms_ease" : {}}
+
+KEY_NAMES = {"left" : pg.K_LEFT, "right" : pg.K_RIGHT}
+
+DEFAULT_SCRIPT = ["120 right", "30 right jump", "60", "120 left",
+                  "20 left jump", "40 jump", "90 right"]
+
+
+class ScriptedKeys(object):
+    """Stands in for the sequence returned by pg.key.get_pressed()."""
+    def __init__(self, held):
+        """Held is a collection of the key constants currently held."""
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+def parse_script(lines):
+    """
+    Parse script lines into a list of (frames, keys, jump) segments.  Raises
+    ValueError if no segment lasts at least one frame, as such a script
+    would never advance.
+    """
+    segments = []
+    for line in lines:
+        words = line.split()
+        if not words or words[0].startswith("#"):
+            continue
+        held = ScriptedKeys(KEY_NAMES[word] for word in words[1:]
+                            if word != "jump")
+        segments.append((int(words[0]), held, "jump" in words[1:]))
+    if not any(length > 0 for length, _, _ in segments):
+        raise ValueError("Script has no segment of one or more frames.")
+    return segments
+
+
+def key_feed(segments, frames):
+    """
+    Yield (keys, events) for each of frames frames, repeating the script
+    segments as needed.
+    """
+    frame = 0
+    while frame < frames:
+        for length, held, jump in segments:
+            for i in range(length):
+                events = []
+                if jump and i == 0:
+                    events.append(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE))
+                if jump and i == length-1:
+                    events.append(pg.event.Event(pg.KEYUP, key=pg.K_SPACE))
+                yield held, events
+                frame += 1
+                if frame >= frames:
+                    return
+
+
+def load_sample(name):
+    """
+    Import a sample, set the (dummy) display mode and load the images its
+    __main__ block would.
+    """
+    sample = importlib.import_module(name)
+    pg.display.set_mode(sample.SCREEN_SIZE)
+    for global_name, filename in IMAGES[name].items():
+        image = pg.image.load(filename).convert_alpha()
+        setattr(sample, global_name, image)
+    return sample
+
+
+def simulate(control, feed):
+    """
+    Step control through every frame of feed without presenting anything.
+    Returns the number of frames simulated and the time taken in seconds.
+    """
+    frames = 0
+    start = timeit.default_timer()
+    for keys, events in feed:
+        for event in events:
+            pg.event.post(event)
+        control.event_loop()
+        control.update(keys)
+        frames += 1
+    return frames, timeit.default_timer()-start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sample", choices=sorted(IMAGES))
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--script", help="key script file (see above)")
+    args = parser.parse_args()
+    if args.script:
+        with open(args.script) as script_file:
+            segments = parse_script(script_file)
+    else:
+        segments = parse_script(DEFAULT_SCRIPT)
+    pg.init()
+    sample = load_sample(args.sample)
+    control = sample.Control()
+    frames, elapsed = simulate(control, key_feed(segments, args.frames))
+    message = "{}: {} frames in {:.2f}s ({:.0f} simulated frames/second)"
+    print(message.format(args.sample, frames, elapsed, frames/elapsed))
+    print("Final player rect: {}".format(control.player.rect))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+A compact binary level format for moving_platforms, read through mmap so that
+levels with hundreds of thousands of obstacles can be streamed in a region at
+a time rather than loaded whole.
+
+The file is laid out as follows (all values little endian):
+  header     magic, version, region size, level width and height, region
+             columns and rows, and the number of blocks, platforms and
+             index entries.
+  blocks     one fixed width record per static block: x, y, w, h, r, g, b.
+  platforms  one fixed width record per moving block: x, y, w, h, r, g, b,
+             axis, end, start, delay, speed (as MovingBlock takes them).
+  regions    a (first, count) pair into the index for each region, row by row.
+  index      the record ids of every obstacle overlapping each region; for a
+             platform, anywhere along its path.  Ids below the block count
+             are blocks, the rest are platforms.
+
+Converting the built in level (from within the platforming directory):
+    python level_format.py level.lvl
+    python level_format.py big.lvl --repeat 75
+The second tiles the level 75 times in each direction, giving just over
+100,000 obstacles.  Play a converted level with:
+    python moving_platforms.py big.lvl
+"""
+
+import os
+import mmap
+import struct
+import argparse
+
+import pygame as pg
+
+
+MAGIC = b"PLVL"
+VERSION = 1
+REGION_SIZE = 500
+REGION_MARGIN = 250
+
+HEADER = struct.Struct("<4sHHiiiiIII")
+BLOCK = struct.Struct("<iiiiBBBx")
+PLATFORM = struct.Struct("<iiiiBBBBiiii")
+REGION = struct.Struct("<II")
+INDEX = struct.Struct("<I")
+
+
+def block_record(block):
+    """The BLOCK record of a Block."""
+    color = block.image.get_at((0,0))
+    return tuple(block.rect)+(color.r, color.g, color.b)
+
+
+def platform_record(block):
+    """
+    The PLATFORM record of a MovingBlock; its rect is stored at the start of
+    its path and its current position is stored as start.
+    """
+    color = block.image.get_at((0,0))
+    rect = block.rect.copy()
+    rect[block.axis] = block.start
+    return tuple(rect)+(color.r, color.g, color.b, block.axis, block.end,
+                        block.rect[block.axis], block.delay, block.speed)
+
+
+def platform_bounds(record):
+    """The rect covering every position along a platform's path."""
+    rect = pg.Rect(record[:4])
+    end = rect.copy()
+    end[record[7]] = record[8]
+    return rect.union(end)
+
+
+def get_region_span(rect, region_size, columns, rows):
+    """Return the (left, top, right, bottom) regions rect overlaps."""
+    return (max(rect.left//region_size, 0),
+            max(rect.top//region_size, 0),
+            min((max(rect.right, rect.left+1)-1)//region_size, columns-1),
+            min((max(rect.bottom, rect.top+1)-1)//region_size, rows-1))
+
+
+def write_level(filename, blocks, platforms, size, region_size=REGION_SIZE):
+    """
+    Write a level file.  Blocks and platforms are sequences of BLOCK and
+    PLATFORM records; size is the (width, height) of the level.
+    """
+    columns = -(-size[0]//region_size)
+    rows = -(-size[1]//region_size)
+    regions = [[] for _ in range(columns*rows)]
+    bounds = [pg.Rect(record[:4]) for record in blocks]
+    bounds.extend(platform_bounds(record) for record in platforms)
+    for record_id, rect in enumerate(bounds):
+        left, top, right, bottom = get_region_span(rect, region_size,
+                                                   columns, rows)
+        for row in range(top, bottom+1):
+            for column in range(left, right+1):
+                regions[row*columns+column].append(record_id)
+    index_count = sum(len(region) for region in regions)
+    with open(filename, "wb") as level:
+        level.write(HEADER.pack(MAGIC, VERSION, region_size, size[0], size[1],
+                                columns, rows, len(blocks), len(platforms),
+                                index_count))
+        for record in blocks:
+            level.write(BLOCK.pack(*record))
+        for record in platforms:
+            level.write(PLATFORM.pack(*record))
+        first = 0
+        for region in regions:
+            level.write(REGION.pack(first, len(region)))
+            first += len(region)
+        for region in regions:
+            level.write(struct.pack("<{}I".format(len(region)), *region))
+
+
+class LevelFile(object):
+    """
+    A level file mapped into memory.  Nothing but the header is read until
+    regions and records are asked for.
+    """
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self.data)
+        magic, version, self.region_size, width, height = header[:5]
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} level.".format(filename,
+                                                                    VERSION))
+        self.columns, self.rows = header[5:7]
+        self.block_count, self.platform_count = header[7:9]
+        self.rect = pg.Rect(0, 0, width, height)
+        self.platforms_at = HEADER.size+BLOCK.size*self.block_count
+        self.regions_at = self.platforms_at+PLATFORM.size*self.platform_count
+        self.index_at = self.regions_at+REGION.size*self.columns*self.rows
+
+    def get_span(self, rect):
+        """Return the (left, top, right, bottom) regions rect overlaps."""
+        return get_region_span(rect, self.region_size, self.columns, self.rows)
+
+    def get_ids(self, region):
+        """Return the record ids of every obstacle overlapping region."""
+        column, row = region
+        offset = self.regions_at+REGION.size*(row*self.columns+column)
+        first, count = REGION.unpack_from(self.data, offset)
+        offset = self.index_at+INDEX.size*first
+        return struct.unpack_from("<{}I".format(count), self.data, offset)
+
+    def get_record(self, record_id):
+        """Return ("block", BLOCK record) or ("platform", PLATFORM record)."""
+        if record_id < self.block_count:
+            offset = HEADER.size+BLOCK.size*record_id
+            return "block", BLOCK.unpack_from(self.data, offset)
+        record_id -= self.block_count
+        offset = self.platforms_at+PLATFORM.size*record_id
+        return "platform", PLATFORM.unpack_from(self.data, offset)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+class LevelStreamer(object):
+    """
+    Decides which obstacles of a LevelFile should be loaded.  Regions within
+    margin pixels of the viewport are loaded; regions are only unloaded once
+    they are more than twice margin away, so that walking back and forth
+    over a region boundary doesn't load and unload the same obstacles every
+    frame.  Obstacles overlapping several loaded regions are loaded once.
+    """
+    def __init__(self, level, margin=REGION_MARGIN):
+        self.level = level
+        self.margin = margin
+        self.regions = {}
+        self.references = {}
+        self.span = None
+
+    def update(self, viewport):
+        """
+        Return a sorted list of the record ids that should now be loaded,
+        and a list of those that should be unloaded.
+        """
+        margin = self.margin
+        span = self.level.get_span(viewport.inflate(2*margin, 2*margin))
+        if span == self.span:
+            return [], []
+        self.span = span
+        keep = self.level.get_span(viewport.inflate(4*margin, 4*margin))
+        loaded, unloaded = [], []
+        for column in range(span[0], span[2]+1):
+            for row in range(span[1], span[3]+1):
+                if (column,row) not in self.regions:
+                    loaded.extend(self.load((column,row)))
+        for region in list(self.regions):
+            column, row = region
+            if not (keep[0] <= column <= keep[2] and
+                    keep[1] <= row <= keep[3]):
+                unloaded.extend(self.unload(region))
+        return sorted(loaded), unloaded
+
+    def load(self, region):
+        """Load region, returning the ids not already loaded by another."""
+        ids = self.regions[region] = self.level.get_ids(region)
+        loaded = []
+        for record_id in ids:
+            self.references[record_id] = self.references.get(record_id, 0)+1
+            if self.references[record_id] == 1:
+                loaded.append(record_id)
+        return loaded
+
+    def unload(self, region):
+        """Unload region, returning the ids no other region still needs."""
+        unloaded = []
+        for record_id in self.regions.pop(region):
+            self.references[record_id] -= 1
+            if not self.references[record_id]:
+                del self.references[record_id]
+                unloaded.append(record_id)
+        return unloaded
+
+
+def convert(control, repeat=1):
+    """
+    Return the block records, platform records and level size of the level
+    in control, tiled repeat times in each direction.
+    """
+    blocks, platforms = [], []
+    width, height = control.level_rect.size
+    for obstacle in control.obstacles:
+        if obstacle.type == "moving":
+            platforms.append(platform_record(obstacle))
+        else:
+            blocks.append(block_record(obstacle))
+    tiled_blocks, tiled_platforms = [], []
+    for i in range(repeat):
+        for j in range(repeat):
+            x, y = i*width, j*height
+            for record in blocks:
+                tiled_blocks.append((record[0]+x, record[1]+y)+record[2:])
+            for record in platforms:
+                shift = (x, y)[record[7]]
+                tiled_platforms.append((record[0]+x, record[1]+y)+
+                                       record[2:8]+
+                                       (record[8]+shift, record[9]+shift)+
+                                       record[10:])
+    return tiled_blocks, tiled_platforms, (width*repeat, height*repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("output")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="tile the level this many times each way")
+    parser.add_argument("--region-size", type=int, default=REGION_SIZE)
+    args = parser.parse_args()
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    import moving_platforms
+    pg.display.set_mode(moving_platforms.SCREEN_SIZE)
+    control = moving_platforms.Control()
+    blocks, platforms, size = convert(control, args.repeat)
+    write_level(args.output, blocks, platforms, size, args.region_size)
+    message = "{}: {} blocks, {} platforms, {}x{} pixels"
+    print(message.format(args.output, len(blocks), len(platforms), *size))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares testing a player against a level of static blocks using a mask per
+block (a rect test against every block, then a mask test against each block
+hit) with testing it against a single StaticLayer mask that every block has
+been baked into.  Levels of 50, 500 and 5000 randomly placed blocks are
+generated; both approaches are checked to give the same answers and the
+average cost per query is printed.
+
+Runs headless; run it from within the platforming directory.
+"""
+
+import os
+import sys
+import random
+import timeit
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+import pygame as pg
+
+import fall_mask
+import static_layer
+
+
+BLOCK_COUNTS = (50, 500, 5000)
+QUERIES = 1000
+
+
+def make_level(count):
+    """Place count blocks on random, distinct cells of a square grid."""
+    side = int((count*4)**0.5)+1
+    cells = random.sample(range(side*side), count)
+    blocks = [fall_mask.Block((50*(cell%side), 50*(cell//side)))
+              for cell in cells]
+    return blocks, pg.Rect(0, 0, 50*side, 50*side)
+
+
+def per_block(player, obstacles):
+    """The old approach; every block carries its own mask."""
+    collisions = pg.sprite.spritecollide(player, obstacles, False)
+    collidable = pg.sprite.collide_mask
+    return pg.sprite.spritecollideany(player, collisions, collidable)
+
+
+def main():
+    pg.init()
+    pg.display.set_mode(fall_mask.SCREEN_SIZE)
+    fall_mask.SHADE_IMG = pg.image.load("shader.png").convert_alpha()
+    fall_mask.PLAYER_IMAGE = pg.image.load("smallface.png").convert_alpha()
+    player = fall_mask.Player((0,0), 4)
+    print("{:>7} {:>16} {:>16}".format("blocks", "per-block (us)",
+                                       "baked (us)"))
+    for count in BLOCK_COUNTS:
+        blocks, bounds = make_level(count)
+        obstacles = pg.sprite.Group(blocks)
+        level = static_layer.StaticLayer(obstacles)
+        for block in blocks:
+            block.mask = pg.mask.from_surface(block.image)
+        spots = [(random.randrange(bounds.w), random.randrange(bounds.h))
+                 for _ in range(QUERIES)]
+        for spot in spots:
+            player.rect.topleft = spot
+            old = per_block(player, obstacles)
+            if bool(old) != bool(level.collide(player)):
+                sys.exit("Mismatch with {} blocks at {}".format(count, spot))
+        def run_old():
+            for spot in spots:
+                player.rect.topleft = spot
+                per_block(player, obstacles)
+        def run_new():
+            for spot in spots:
+                player.rect.topleft = spot
+                level.collide(player)
+        times = [1e6*min(timeit.repeat(run, number=1, repeat=3))/QUERIES
+                 for run in (run_old, run_new)]
+        print("{:>7} {:>16.2f} {:>16.2f}".format(count, *times))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,20 @@ Basic moving platforms using only rectangle collision.
 
 import os
 import sys
+import heapq
+import collections
 import pygame as pg
 
+from spatial import SpatialGroup
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+from level_format import LevelFile, LevelStreamer
+
 
 CAPTION = "Moving Platforms"
 SCREEN_SIZE = (700,500)
+BACKGROUND_COLOR = pg.Color("lightblue")
 
 
 class _Physics(object):
@@ -70,54 +79,57 @@ class Player(_Physics, pg.sprite.Sprite):
             self.fall = True
             self.on_moving = False
 
-    def check_moving(self,obstacles):
+    def check_moving(self, contacts):
         """
         Check if the player is standing on a moving platform.
         If the player is in contact with multiple platforms, the prevously
         detected platform will take presidence.
         """
         if not self.fall:
-            now_moving = self.on_moving
-            any_moving, any_non_moving = [], []
-            for collide in self.collide_below:
-                if collide.type == "moving":
-                    self.on_moving = collide
-                    any_moving.append(collide)
-                else:
-                    any_non_moving.append(collide)
+            any_moving = contacts.get_moving_supports(self)
             if not any_moving:
                 self.on_moving = False
-            elif any_non_moving or now_moving in any_moving:
-                self.on_moving = now_moving
+            elif (len(any_moving) == len(self.collide_below) and
+                    self.on_moving not in any_moving):
+                self.on_moving = any_moving[-1]
 
-    def check_collisions(self, offset, index, obstacles):
+    def check_collisions(self, offset, index, obstacles, exclude=None):
         """
         This function checks if a collision would occur after moving offset
-        pixels. If a collision is detected, the position is decremented by one
-        pixel and retested. This continues until we find exactly how far we can
-        safely move, or we decide we can't move.
+        pixels, ignoring the bodies in the collection exclude if given. If a
+        collision is detected, rather than backing out one pixel at a time, the
+        player is placed flush against the obstacles it overlaps and retested.
+        The result is identical to the pixel by pixel approach, but the cost no
+        longer grows with our speed. Obstacles is the ContactGraph, so other
+        actors are collided with too, and each check only looks at the cells
+        our rect overlaps.
         """
         unaltered = True
         self.rect[index] += offset[index]
-        while pg.sprite.spritecollideany(self, obstacles):
-            self.rect[index] += (1 if offset[index]<0 else -1)
+        hits = obstacles.spritecollide(self, exclude=exclude)
+        while hits:
+            self.rect[index] = self.flush_position(hits, offset, index)
+            hits = obstacles.spritecollide(self, exclude=exclude)
             unaltered = False
         return unaltered
 
+    def flush_position(self, hits, offset, index):
+        """
+        Find the position along index that places the player against the far
+        side of every obstacle in hits, opposite to the direction of offset.
+        """
+        if offset[index] < 0:
+            return max(hit.rect[index]+hit.rect.size[index] for hit in hits)
+        else:
+            return min(hit.rect[index] for hit in hits)-self.rect.size[index]
+
     def check_above(self, obstacles):
         """When jumping, don't enter fall state if there is no room to jump."""
         self.rect.move_ip(0, -1)
-        collide = pg.sprite.spritecollideany(self, obstacles)
+        collide = obstacles.spritecollideany(self)
         self.rect.move_ip(0, 1)
         return collide
 
-    def check_below(self, obstacles):
-        """Check to see if the player is contacting the ground."""
-        self.rect.move_ip((0,1))
-        collide = pg.sprite.spritecollide(self, obstacles, False)
-        self.rect.move_ip((0,-1))
-        return collide
-
     def jump(self, obstacles):
         """Called when the user presses the jump button."""
         if not self.fall and not self.check_above(obstacles):
@@ -131,10 +143,13 @@ class Player(_Physics, pg.sprite.Sprite):
             if self.y_vel < self.jump_cut_magnitude:
                 self.y_vel = self.jump_cut_magnitude
 
-    def pre_update(self, obstacles):
-        """Ran before platforms are updated."""
-        self.collide_below = self.check_below(obstacles)
-        self.check_moving(obstacles)
+    def pre_update(self, contacts):
+        """
+        Ran before platforms are updated. The contact graph only looks for
+        what we are standing on if we or a nearby platform have moved.
+        """
+        self.collide_below = contacts.get_supports(self)
+        self.check_moving(contacts)
 
     def update(self, obstacles, keys):
         """Everything we need to stay updated; ran after platforms update."""
@@ -142,9 +157,9 @@ class Player(_Physics, pg.sprite.Sprite):
         self.get_position(obstacles)
         self.physics_update()
 
-    def draw(self, surface):
-        """Blit the player to the target surface."""
-        surface.blit(self.image, self.rect)
+    def draw(self, surface, offset=(0,0)):
+        """Blit the player to the target surface, shifted by offset."""
+        surface.blit(self.image, self.rect.move(offset))
 
 
 class Block(pg.sprite.Sprite):
@@ -180,11 +195,12 @@ class MovingBlock(Block):
         self.waiting = False
         self.type = "moving"
 
-    def update(self, player, obstacles):
-        """Update position. This should be done before moving any actors."""
-        obstacles = obstacles.copy()
-        obstacles.remove(self)
-        now = pg.time.get_ticks()
+    def update(self, now, obstacles, contacts):
+        """
+        Update position. This should be done before moving any actors.
+        Now is the current time in milliseconds. The obstacles SpatialGroup
+        and the contacts graph are informed of our new position.
+        """
         if not self.waiting:
             speed = self.speed
             start_passed = self.start >= self.rect[self.axis]+speed
@@ -196,26 +212,46 @@ class MovingBlock(Block):
                     speed = self.end-self.rect[self.axis]
                 self.change_direction(now)
             self.rect[self.axis] += speed
-            self.move_player(now, player, obstacles, speed)
+            self.move_riders(now, contacts, speed)
+            obstacles.relocate(self)
+            contacts.body_moved(self)
         elif now-self.timer > self.delay:
             self.waiting = False
 
-    def move_player(self, now, player, obstacles, speed):
+    def move_riders(self, now, contacts, speed):
         """
-        Moves the player both when on top of, or bumped by the platform.
-        Collision checks are in place to prevent the block pushing the player
-        through a wall.
+        Moves the actors on top of, or bumped by the platform, and any actors
+        stacked on those. Each is carried by however far the body it rides
+        actually moved, working up the stack from the platform. Collision
+        checks are in place to prevent the block pushing an actor through a
+        wall. The block and its passengers move together, so they are
+        excluded from these checks. Afterwards, working back down the stack,
+        any body still overlapping an actor it carries is put back flush
+        against it; if that body is the block, it changes direction.
         """
-        if player.on_moving is self or pg.sprite.collide_rect(self,player):
-            axis = self.axis
-            offset = (speed, speed)
-            player.check_collisions(offset, axis, obstacles)
-            if pg.sprite.collide_rect(self, player):
-                if self.speed > 0:
-                    self.rect[axis] = player.rect[axis]-self.rect.size[axis]
+        axis = self.axis
+        passengers = contacts.get_passengers(self)
+        exclude = set(actor for actor, carrier in passengers)
+        exclude.add(self)
+        moved = {self: speed}
+        for actor, carrier in passengers:
+            start = actor.rect[axis]
+            offset = (moved[carrier], moved[carrier])
+            actor.check_collisions(offset, axis, contacts, exclude)
+            moved[actor] = actor.rect[axis]-start
+        for actor, carrier in reversed(passengers):
+            if pg.sprite.collide_rect(carrier, actor):
+                forward = self.speed if carrier is self else moved[carrier]
+                if forward > 0:
+                    position = actor.rect[axis]-carrier.rect.size[axis]
                 else:
-                    self.rect[axis] = player.rect[axis]+player.rect.size[axis]
-                self.change_direction(now)
+                    position = actor.rect[axis]+actor.rect.size[axis]
+                moved[carrier] += position-carrier.rect[axis]
+                carrier.rect[axis] = position
+                if carrier is self:
+                    self.change_direction(now)
+                else:
+                    contacts.actors.relocate(carrier)
 
     def change_direction(self, now):
         """Called when the platform reaches an endpoint or has no more room."""
@@ -224,22 +260,297 @@ class MovingBlock(Block):
         self.speed *= -1
 
 
+class PlatformScheduler(object):
+    """
+    Updates a level's moving blocks, skipping those waiting at an endpoint.
+    Waiting blocks are put to sleep on a heap keyed by the time they are due
+    to wake, so each frame only active blocks (and those just waking) are
+    updated, however many are paused.
+    """
+    def __init__(self, platforms):
+        """Platforms are updated in the order given, as a Group would."""
+        self.order = {}
+        self.added = 0
+        self.active = []
+        self.sleeping = []
+        for platform in platforms:
+            self.add(platform)
+
+    def add(self, platform):
+        """Start updating platform, after all those already added."""
+        self.order[platform] = self.added
+        self.added += 1
+        self.active.append(platform)
+
+    def remove(self, platform):
+        """
+        Stop updating platform. If it is asleep its heap entry is left in
+        place and discarded when it comes due.
+        """
+        del self.order[platform]
+        if platform in self.active:
+            self.active.remove(platform)
+
+    def update(self, now, obstacles, contacts):
+        """Wake any blocks that are due, then update all active blocks."""
+        if self.sleeping and self.sleeping[0][0] < now:
+            while self.sleeping and self.sleeping[0][0] < now:
+                platform = heapq.heappop(self.sleeping)[2]
+                if platform in self.order:
+                    self.active.append(platform)
+            self.active.sort(key=self.order.get)
+        for platform in self.active:
+            platform.update(now, obstacles, contacts)
+        if any(platform.waiting for platform in self.active):
+            for platform in self.active:
+                if platform.waiting:
+                    wake = platform.timer+platform.delay
+                    entry = (wake, self.order[platform], platform)
+                    heapq.heappush(self.sleeping, entry)
+            self.active = [platform for platform in self.active
+                           if not platform.waiting]
+
+
+class ContactGraph(object):
+    """
+    Keeps track of which bodies each actor is standing on.  Actors are bodies
+    too, so actors can stand on one another.  An actor's supports are only
+    searched for again if the actor has moved, or if a body it stands on (or
+    one that moved to just beneath it) has moved; otherwise the previous
+    answer is returned.  Bodies also know their riders, so the actors a
+    moving platform carries, directly or through a stack of other actors,
+    are found without a collision query.
+
+    The graph is passed in place of the obstacles group when moving actors,
+    so that actors collide with one another as well as with the level.
+    """
+    def __init__(self, obstacles, cell_size=100):
+        """Obstacles is the level's SpatialGroup of bodies."""
+        self.obstacles = obstacles
+        self.actors = SpatialGroup(cell_size=cell_size)
+        self.supports = {}
+        self.moving = {}
+        self.riders = collections.defaultdict(set)
+        self.rects = {}
+        self.dirty = set()
+
+    def add_actor(self, actor):
+        """Start tracking the supports of actor."""
+        self.actors.add(actor)
+        self.supports[actor] = []
+        self.moving[actor] = []
+        self.rects[actor] = None
+        self.dirty.add(actor)
+
+    def remove_actor(self, actor):
+        """Stop tracking actor, both as a rider and as a body."""
+        for body in self.supports.pop(actor):
+            self.riders[body].discard(actor)
+        self.remove_body(actor)
+        del self.moving[actor]
+        del self.rects[actor]
+        self.dirty.discard(actor)
+        self.actors.remove(actor)
+
+    def refresh(self):
+        """
+        Call once per frame, before any supports are asked for.  Every actor
+        that has moved since its supports were last found is treated as a
+        body that has moved, so those standing on it are checked again.
+        """
+        for actor, rect in self.rects.items():
+            if rect != actor.rect:
+                self.actors.relocate(actor)
+                self.body_moved(actor)
+
+    def body_moved(self, body):
+        """
+        Call after body has moved.  Its riders, and any actor now directly
+        above it, will have their supports found again when next asked.
+        """
+        self.dirty.update(self.riders[body])
+        self.dirty.update(self.actors.query(body.rect.move(0, -1), body))
+
+    def remove_body(self, body):
+        """
+        Call when body is removed from the level.  It is dropped from the
+        supports of every actor that stood on it, and those actors will have
+        their supports found again when next asked.
+        """
+        for actor in self.riders.pop(body, ()):
+            self.supports[actor] = [support for support in self.supports[actor]
+                                    if support is not body]
+            self.moving[actor] = [support for support in self.moving[actor]
+                                  if support is not body]
+            self.dirty.add(actor)
+
+    def get_supports(self, actor):
+        """Return the bodies actor is standing on, in group order."""
+        if actor in self.dirty or self.rects[actor] != actor.rect:
+            self.find_supports(actor)
+        return self.supports[actor]
+
+    def get_moving_supports(self, actor):
+        """
+        Return the moving bodies actor is standing on, in group order.
+        Other actors count as moving bodies.
+        """
+        self.get_supports(actor)
+        return self.moving[actor]
+
+    def find_supports(self, actor):
+        """Query the obstacles and actors for the bodies just beneath actor."""
+        self.dirty.discard(actor)
+        self.rects[actor] = pg.Rect(actor.rect)
+        self.actors.relocate(actor)
+        for body in self.supports[actor]:
+            self.riders[body].discard(actor)
+        below = actor.rect.move(0, 1)
+        supports = (self.obstacles.query(below)+
+                    self.actors.query(below, actor))
+        for body in supports:
+            self.riders[body].add(actor)
+        self.supports[actor] = supports
+        self.moving[actor] = [body for body in supports
+                              if body in self.rects or body.type == "moving"]
+
+    def get_passengers(self, body):
+        """
+        Return (actor, carrier) pairs for every actor moved along with body:
+        the actors body overlaps, carried by body itself, and then each actor
+        riding (see Player.on_moving) a carried body, carried by that body.
+        Supports are followed transitively and the pairs are in topological
+        order, so every carrier comes before the actors it carries.
+        """
+        bumped = self.actors.query(body.rect)
+        passengers = [(actor, body) for actor in bumped]
+        seen = set(bumped)
+        queue = collections.deque([body]+bumped)
+        while queue:
+            carrier = queue.popleft()
+            riders = sorted(self.riders.get(carrier, ()),
+                            key=self.actors.order.get)
+            for rider in riders:
+                if rider.on_moving is carrier and rider not in seen:
+                    seen.add(rider)
+                    passengers.append((rider, carrier))
+                    queue.append(rider)
+        return passengers
+
+    def spritecollide(self, sprite, exclude=None):
+        """
+        Return the obstacles and then the other actors sprite collides with,
+        leaving out any bodies in the collection exclude.  A moving actor is
+        re-bucketed first, so the actors group always knows where it is.
+        """
+        if sprite in self.rects:
+            self.actors.relocate(sprite)
+        rect = sprite.rect
+        hits = self.obstacles.query(rect)+self.actors.query(rect, sprite)
+        if exclude:
+            hits = [hit for hit in hits if hit not in exclude]
+        return hits
+
+    def spritecollideany(self, sprite):
+        """Return an obstacle or other actor sprite collides with, or None."""
+        rect = sprite.rect
+        hits = self.obstacles.query(rect) or self.actors.query(rect, sprite)
+        return hits[0] if hits else None
+
+
+class ChunkedLayer(object):
+    """
+    The static geometry of a level pre-rendered onto square chunk surfaces.
+    Chunks are rendered the first time they are seen and kept in a least
+    recently used cache, so the cost of drawing depends only on the size of
+    the viewport, not the size of the level.
+    """
+    def __init__(self, obstacles, chunk_size=256, max_chunks=64):
+        """
+        Obstacles is the level's SpatialGroup; only blocks that aren't moving
+        are rendered. Max_chunks should comfortably exceed the number of
+        chunks a viewport can overlap.
+        """
+        self.obstacles = obstacles
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = collections.OrderedDict()
+
+    def get_chunk(self, key):
+        """Return the chunk surface for key, rendering it if needed."""
+        if key in self.chunks:
+            self.chunks[key] = chunk = self.chunks.pop(key)
+        else:
+            chunk = self.chunks[key] = self.render_chunk(key)
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        return chunk
+
+    def render_chunk(self, key):
+        """Render the background and static blocks that fall within a chunk."""
+        size = self.chunk_size
+        rect = pg.Rect(key[0]*size, key[1]*size, size, size)
+        chunk = pg.Surface(rect.size).convert()
+        chunk.fill(BACKGROUND_COLOR)
+        for block in self.obstacles.query(rect):
+            if block.type != "moving":
+                chunk.blit(block.image, block.rect.move(-rect.x, -rect.y))
+        return chunk
+
+    def invalidate(self, rect):
+        """Discard any rendered chunks that rect overlaps."""
+        size = self.chunk_size
+        for i in range(rect.left//size, (rect.right-1)//size+1):
+            for j in range(rect.top//size, (rect.bottom-1)//size+1):
+                self.chunks.pop((i,j), None)
+
+    def draw(self, surface, viewport):
+        """Blit the chunks that viewport overlaps to surface."""
+        size = self.chunk_size
+        for i in range(viewport.left//size, (viewport.right-1)//size+1):
+            for j in range(viewport.top//size, (viewport.bottom-1)//size+1):
+                position = (i*size-viewport.x, j*size-viewport.y)
+                surface.blit(self.get_chunk((i,j)), position)
+
+
 class Control(object):
     """Class for managing event loop and game states."""
-    def __init__(self):
-        """Initalize the display and prepare game objects."""
+    def __init__(self, level=None):
+        """
+        Initalize the display and prepare game objects. If level is the name
+        of a level file (see level_format.py) its obstacles are streamed in
+        around the viewport; otherwise the built in level is used.
+        """
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
+        self.ticks = 0
+        self.now = 0.0
         self.keys = pg.key.get_pressed()
         self.done = False
         self.player = Player((50,875), 4)
         self.viewport = self.screen.get_rect()
-        self.level = pg.Surface((1000,1000)).convert()
-        self.level_rect = self.level.get_rect()
+        self.level = LevelFile(level) if level else None
+        if self.level:
+            self.level_rect = self.level.rect.copy()
+            self.streamer = LevelStreamer(self.level)
+            self.streamed = {}
+            self.obstacles = SpatialGroup(cell_size=100)
+        else:
+            self.level_rect = pg.Rect(0, 0, 1000, 1000)
+            self.obstacles = self.make_obstacles()
         self.win_text,self.win_rect = self.make_text()
-        self.obstacles = self.make_obstacles()
+        self.static_layer = ChunkedLayer(self.obstacles)
+        self.platforms = PlatformScheduler(obstacle for obstacle
+                                           in self.obstacles
+                                           if obstacle.type == "moving")
+        self.contacts = ContactGraph(self.obstacles)
+        self.contacts.add_actor(self.player)
+        if self.level:
+            self.update_viewport()
+            self.stream_level()
 
     def make_text(self):
         """Renders a text object. Text is only rendered once."""
@@ -250,7 +561,7 @@ class Control(object):
         return text, rect
 
     def make_obstacles(self):
-        """Adds some arbitrarily placed obstacles to a sprite.Group."""
+        """Adds some arbitrarily placed obstacles to a SpatialGroup."""
         walls = [Block(pg.Color("chocolate"), (0,980,1000,20)),
                  Block(pg.Color("chocolate"), (0,0,20,1000)),
                  Block(pg.Color("chocolate"), (980,0,20,1000))]
@@ -273,7 +584,41 @@ class Control(object):
                               (500,700,50,20), 730, 0, start=730),
                   MovingBlock(pg.Color("olivedrab"),
                               (780,700,50,20), 895, 0, speed=-1)]
-        return pg.sprite.Group(walls, static, moving)
+        return SpatialGroup(walls, static, moving, cell_size=100)
+
+    def make_streamed(self, kind, record):
+        """Create the Block or MovingBlock for a level file record."""
+        color, rect = record[4:7], record[:4]
+        if kind == "block":
+            return Block(color, rect)
+        axis, end, start, delay, speed = record[7:]
+        return MovingBlock(color, rect, end, axis, delay, speed, start)
+
+    def stream_level(self):
+        """
+        Load the obstacles of level regions the viewport is approaching and
+        unload those of regions left well behind.  A player riding a platform
+        that is unloaded stops riding it.
+        """
+        loaded, unloaded = self.streamer.update(self.viewport)
+        for record_id in unloaded:
+            obstacle = self.streamed.pop(record_id)
+            obstacle.kill()
+            self.contacts.remove_body(obstacle)
+            if self.player.on_moving is obstacle:
+                self.player.on_moving = False
+            if obstacle.type == "moving":
+                self.platforms.remove(obstacle)
+            else:
+                self.static_layer.invalidate(obstacle.rect)
+        for record_id in loaded:
+            obstacle = self.make_streamed(*self.level.get_record(record_id))
+            self.streamed[record_id] = obstacle
+            self.obstacles.add(obstacle)
+            if obstacle.type == "moving":
+                self.platforms.add(obstacle)
+            else:
+                self.static_layer.invalidate(obstacle.rect)
 
     def update_viewport(self):
         """
@@ -283,51 +628,81 @@ class Control(object):
         self.viewport.center = self.player.rect.center
         self.viewport.clamp_ip(self.level_rect)
 
-    def event_loop(self):
-        """We can always quit, and the player can sometimes jump."""
-        for event in pg.event.get():
+    def event_loop(self, events=None):
+        """
+        We can always quit, and the player can sometimes jump. If events is
+        given it is handled in place of the event queue (see replay.py).
+        """
+        if events is None:
+            events = pg.event.get()
+        for event in events:
             if event.type == pg.QUIT or self.keys[pg.K_ESCAPE]:
                 self.done = True
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_SPACE:
-                    self.player.jump(self.obstacles)
+                    self.player.jump(self.contacts)
             elif event.type == pg.KEYUP:
                 if event.key == pg.K_SPACE:
                     self.player.jump_cut()
 
-    def update(self):
-        """Update the player, obstacles, and current viewport."""
-        self.keys = pg.key.get_pressed()
-        self.player.pre_update(self.obstacles)
-        self.obstacles.update(self.player, self.obstacles)
-        self.player.update(self.obstacles, self.keys)
+    def update(self, keys=None):
+        """
+        Update the player, obstacles, and current viewport. If keys is given
+        it is used in place of the keyboard state (see headless.py).
+        Platform timers run on simulated time, advanced a fixed 1/fps seconds
+        per update, so a run depends only on its input and not on how fast
+        frames are actually processed.  The time is computed from a count of
+        updates rather than summed, so no rounding error builds up.
+        """
+        self.keys = pg.key.get_pressed() if keys is None else keys
+        self.ticks += 1
+        self.now = self.ticks*1000.0/self.fps
+        self.contacts.refresh()
+        self.player.pre_update(self.contacts)
+        self.platforms.update(self.now, self.obstacles, self.contacts)
+        self.player.update(self.contacts, self.keys)
         self.update_viewport()
+        if self.level:
+            self.stream_level()
 
     def draw(self):
         """
-        Draw all necessary objects to the level surface, and then draw
-        the viewport section of the level to the display surface.
+        Draw the pre-rendered static chunks under the viewport, and then
+        the moving blocks, text and player, offset by the viewport position.
         """
-        self.level.fill(pg.Color("lightblue"))
-        self.obstacles.draw(self.level)
-        self.level.blit(self.win_text, self.win_rect)
-        self.player.draw(self.level)
-        self.screen.blit(self.level, (0,0), self.viewport)
+        self.static_layer.draw(self.screen, self.viewport)
+        offset = (-self.viewport.x, -self.viewport.y)
+        for block in self.obstacles.query(self.viewport):
+            if block.type == "moving":
+                self.screen.blit(block.image, block.rect.move(offset))
+        self.screen.blit(self.win_text, self.win_rect.move(offset))
+        self.player.draw(self.screen, offset)
 
     def display_fps(self):
-        """Show the programs FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the programs FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """As simple as it gets."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 if __name__ == "__main__":
@@ -335,7 +710,7 @@ if __name__ == "__main__":
     pg.init()
     pg.display.set_caption(CAPTION)
     pg.display.set_mode(SCREEN_SIZE)
-    run_it = Control()
+    run_it = Control(sys.argv[1] if len(sys.argv) > 1 else None)
     run_it.main_loop()
     pg.quit()
     sys.exit()
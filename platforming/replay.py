@@ -0,0 +1,180 @@
+"""
+Records play of the moving_platforms level to a compact binary log, and
+replays a log headless at uncapped speed, checking that the player follows
+exactly the recorded trajectory.  A recording is both a reproducible workload
+for timing changes and a regression test for them; if a change to the
+collision code alters how the level plays, the replay reports the first frame
+where the player's position differs.
+
+Each frame the log stores the keys Control.update reads from
+pg.key.get_pressed(), the KEYDOWN and KEYUP events Control.event_loop
+handled, and the player's resulting position.  Platform timers run on
+simulated time, so replaying the same input always gives the same result.
+
+Usage (from within the platforming directory):
+    python replay.py record play.log
+    python replay.py record play.log --script level.txt --frames 100000
+    python replay.py replay play.log
+    python replay.py replay play.log --level big.lvl
+The --script option records a headless.py key script instead of live play;
+--level plays a level file (see level_format.py) instead of the built in
+level.
+"""
+
+import os
+import sys
+import struct
+import timeit
+import argparse
+
+import pygame as pg
+
+import moving_platforms
+
+
+MAGIC = b"MPLG"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+FRAME = struct.Struct("<BBii")
+EVENT = struct.Struct("<BI")
+
+RECORDED_KEYS = (pg.K_LEFT, pg.K_a, pg.K_RIGHT, pg.K_d, pg.K_ESCAPE)
+EVENT_TYPES = (pg.KEYDOWN, pg.KEYUP)
+
+
+class RecordedKeys(object):
+    """Stands in for the sequence returned by pg.key.get_pressed()."""
+    def __init__(self, bits):
+        """Bits has one bit set for each held key of RECORDED_KEYS."""
+        self.held = frozenset(key for i, key in enumerate(RECORDED_KEYS)
+                              if bits & 1<<i)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+def pack_keys(keys):
+    """Pack the state of the RECORDED_KEYS in keys into an integer."""
+    bits = 0
+    for i, key in enumerate(RECORDED_KEYS):
+        if keys[key]:
+            bits |= 1<<i
+    return bits
+
+
+def pack_events(events):
+    """Return (type index, key) pairs for the key events in events."""
+    return [(EVENT_TYPES.index(event.type), event.key) for event in events
+            if event.type in EVENT_TYPES]
+
+
+def write_log(filename, frames):
+    """Frames is a list of (key bits, packed events, position) tuples."""
+    with open(filename, "wb") as log:
+        log.write(HEADER.pack(MAGIC, VERSION, len(frames)))
+        for bits, events, position in frames:
+            log.write(FRAME.pack(bits, len(events), *position))
+            for event in events:
+                log.write(EVENT.pack(*event))
+
+
+def read_log(filename):
+    """Return the list of frames stored in the log file filename."""
+    with open(filename, "rb") as log:
+        data = log.read()
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} log.".format(filename,
+                                                              VERSION))
+    frames = []
+    index = HEADER.size
+    for _ in range(count):
+        bits, event_count, x, y = FRAME.unpack_from(data, index)
+        index += FRAME.size
+        events = []
+        for _ in range(event_count):
+            events.append(EVENT.unpack_from(data, index))
+            index += EVENT.size
+        frames.append((bits, events, (x,y)))
+    return frames
+
+
+def live_feed(control):
+    """Yield (keys, events) from the keyboard, presenting every frame."""
+    while True:
+        events = pg.event.get()
+        yield pg.key.get_pressed(), events
+        control.draw()
+        pg.display.update()
+        control.clock.tick(control.fps)
+        control.display_fps()
+
+
+def record(control, feed):
+    """Run control on each (keys, events) of feed, returning the frames."""
+    frames = []
+    for keys, events in feed:
+        control.event_loop(events)
+        if control.done:
+            break
+        control.update(keys)
+        frames.append((pack_keys(keys), pack_events(events),
+                       control.player.rect.topleft))
+    return frames
+
+
+def replay(control, frames):
+    """
+    Step control through frames as fast as possible, exiting if the player
+    leaves the recorded trajectory.  Returns the time taken in seconds.
+    """
+    start = timeit.default_timer()
+    for frame, (bits, events, position) in enumerate(frames):
+        control.event_loop([pg.event.Event(EVENT_TYPES[kind], key=key)
+                            for kind, key in events])
+        control.update(RecordedKeys(bits))
+        if control.player.rect.topleft != position:
+            message = "Diverged at frame {}: expected {}, got {}."
+            sys.exit(message.format(frame, position,
+                                    control.player.rect.topleft))
+    return timeit.default_timer()-start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("record", "replay"))
+    parser.add_argument("log")
+    parser.add_argument("--script", help="record a headless.py key script")
+    parser.add_argument("--frames", type=int, default=100000,
+                        help="frames of --script to record")
+    parser.add_argument("--level", help="level file to play")
+    args = parser.parse_args()
+    if args.command == "replay" or args.script:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    else:
+        os.environ['SDL_VIDEO_CENTERED'] = '1'
+    pg.init()
+    pg.display.set_caption(moving_platforms.CAPTION)
+    pg.display.set_mode(moving_platforms.SCREEN_SIZE)
+    control = moving_platforms.Control(args.level)
+    if args.command == "replay":
+        frames = read_log(args.log)
+        elapsed = replay(control, frames)
+        message = "{} frames replayed identically in {:.2f}s ({:.0f} fps)"
+        print(message.format(len(frames), elapsed, len(frames)/elapsed))
+    else:
+        if args.script:
+            import headless
+            with open(args.script) as script_file:
+                segments = headless.parse_script(script_file)
+            feed = headless.key_feed(segments, args.frames)
+        else:
+            feed = live_feed(control)
+        frames = record(control, feed)
+        write_log(args.log, frames)
+        print("{} frames recorded to {}".format(len(frames), args.log))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
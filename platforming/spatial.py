@@ -0,0 +1,239 @@
+"""
+A sprite group backed by a uniform grid spatial hash (see common/cell_hash.py).
+Collision queries only look at the sprites in the cells the query rect
+overlaps rather than scanning the entire group.  This makes little difference
+with a handful of obstacles, but once a level has thousands of them it is the
+difference between checking a few sprites and checking all of them.
+SpatialGroup adds sweeping a rect through the hash to the shared queries.
+
+Sprites that move must be passed to SpatialGroup.relocate after moving.  They
+are only re-bucketed if they have crossed into a different set of cells.
+
+All queries accept an exclude argument; the excluded sprite is never reported.
+This lets a member of the group (a moving platform for instance) test against
+everything else without making a copy of the group that omits itself.
+
+SweepAndPrune is a broadphase for things that all move a little every frame.
+The ends of every rect along each axis are kept in sorted lists; as things
+only move a few pixels each frame the lists stay nearly sorted and are
+repaired by insertion sort, and the colliding pairs are updated from the swaps
+made rather than searched for.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.cell_hash import CellHashGroup
+
+
+class SpatialGroup(CellHashGroup):
+    """A CellHashGroup of sprites bucketed by their rects, with sweeps."""
+    def sweep(self, rect, offset, index, exclude=None):
+        """
+        Cast the leading edge of rect offset pixels along axis index (0 for
+        x, 1 for y) and return (time, hits): the fraction of offset that can
+        be moved before touching anything, and the sprites touched there.
+        Time is 1.0 and hits is empty if nothing is in the way.  Rect must
+        not already overlap anything.
+
+        The cells ahead of rect are visited one row (or column) at a time,
+        nearest first, stopping at the first that holds something in the
+        way, so the cost grows with the cells crossed rather than the pixels
+        travelled, and nothing thin enough to fit between two positions can
+        be passed through.
+        """
+        if not offset:
+            return 1.0, []
+        size = self.cell_size
+        across = 1-index
+        low = rect[across]
+        high = low+rect.size[across]
+        if offset > 0:
+            edge = rect[index]+rect.size[index]
+            cells = range(edge//size, (edge+offset-1)//size+1)
+        else:
+            edge = rect[index]
+            cells = range((edge-1)//size, (edge+offset)//size-1, -1)
+        lateral = range(low//size, (max(high, low+1)-1)//size+1)
+        best = abs(offset)
+        hits = []
+        seen = set()
+        for cell in cells:
+            for other in lateral:
+                key = (cell, other) if index == 0 else (other, cell)
+                for sprite in self.cells.get(key, ()):
+                    if sprite in seen or sprite is exclude:
+                        continue
+                    seen.add(sprite)
+                    near = sprite.rect[index]
+                    far = near+sprite.rect.size[index]
+                    start = sprite.rect[across]
+                    end = start+sprite.rect.size[across]
+                    if end <= low or start >= high:
+                        continue
+                    distance = near-edge if offset > 0 else edge-far
+                    if 0 <= distance < best:
+                        best = distance
+                        hits = [sprite]
+                    elif distance == best and distance < abs(offset):
+                        hits.append(sprite)
+            if hits:
+                break
+        hits.sort(key=self.order.__getitem__)
+        return best/float(abs(offset)), hits
+
+
+class SweepAndPrune(object):
+    """
+    Tracks which sprites' rects collide by keeping the ends of every rect
+    sorted along both axes.  A pair collides once it overlaps along both, so
+    the colliding pairs are known at all times without testing any rects.
+    Sprites must be passed to move after they move, or update called once
+    they all have.
+    """
+    def __init__(self, sprites=()):
+        self.endpoints = ([], [])
+        self.ends = {}
+        self.overlaps = ({}, {})
+        self.colliding = {}
+        for sprite in sprites:
+            self.add(sprite)
+
+    def __contains__(self, sprite):
+        return sprite in self.ends
+
+    def __len__(self):
+        return len(self.ends)
+
+    def add(self, sprite):
+        """Start tracking sprite."""
+        self.colliding[sprite] = set()
+        self.overlaps[0][sprite] = set()
+        self.overlaps[1][sprite] = set()
+        ends = []
+        for axis in (0,1):
+            points = self.endpoints[axis]
+            start = [sprite.rect[axis], 1, sprite, len(points)]
+            end = [start[0]+sprite.rect.size[axis], 0, sprite, start[3]+1]
+            points.extend((start, end))
+            self.sift_down(axis, start[3])
+            self.sift_down(axis, end[3])
+            ends.append((start, end))
+        self.ends[sprite] = ends
+
+    def remove(self, sprite):
+        """Stop tracking sprite."""
+        for axis, pair in enumerate(self.ends.pop(sprite)):
+            points = self.endpoints[axis]
+            for end in reversed(pair):
+                del points[end[3]]
+            for i in range(pair[0][3], len(points)):
+                points[i][3] = i
+            for other in self.overlaps[axis].pop(sprite):
+                self.overlaps[axis][other].discard(sprite)
+        for other in self.colliding.pop(sprite):
+            self.colliding[other].discard(sprite)
+
+    def move(self, sprite):
+        """Call after sprite has moved to restore the sort orders."""
+        rect = sprite.rect
+        for axis, (start, end) in enumerate(self.ends[sprite]):
+            value = rect[axis]
+            size = rect.size[axis]
+            old_start, old_end = start[0], end[0]
+            start[0] = value
+            end[0] = value+size
+            if end[0] > old_end:
+                self.sift_up(axis, end[3])
+            if start[0] > old_start:
+                self.sift_up(axis, start[3])
+            elif start[0] < old_start:
+                self.sift_down(axis, start[3])
+            if end[0] < old_end:
+                self.sift_down(axis, end[3])
+
+    def update(self):
+        """
+        Re-read every sprite's rect and insertion sort the endpoints.  This is
+        close to linear as long as sprites have only moved a little.
+        """
+        for ends in self.ends.values():
+            rect = ends[0][0][2].rect
+            for axis, (start, end) in enumerate(ends):
+                start[0] = rect[axis]
+                end[0] = start[0]+rect.size[axis]
+        for axis in (0,1):
+            for i in range(1, len(self.endpoints[axis])):
+                self.sift_down(axis, i)
+
+    def sift_down(self, axis, i):
+        """
+        Move an endpoint towards the start of its list until sorted.  Ends
+        come before starts at the same value, so touching rects don't
+        overlap, just as with pg.Rect.colliderect.  A start passing an end
+        begins an overlap; an end passing a start ends one.
+        """
+        points = self.endpoints[axis]
+        point = points[i]
+        value, kind = point[0], point[1]
+        while i:
+            other = points[i-1]
+            if other[0] < value or (other[0] == value and other[1] <= kind):
+                break
+            if kind != other[1]:
+                self.toggle(axis, point[2], other[2], kind)
+            other[3] = i
+            points[i] = other
+            i -= 1
+        point[3] = i
+        points[i] = point
+
+    def sift_up(self, axis, i):
+        """Move an endpoint towards the end of its list until sorted."""
+        points = self.endpoints[axis]
+        point = points[i]
+        value, kind = point[0], point[1]
+        last = len(points)-1
+        while i < last:
+            other = points[i+1]
+            if other[0] > value or (other[0] == value and other[1] >= kind):
+                break
+            if kind != other[1]:
+                self.toggle(axis, point[2], other[2], other[1])
+            other[3] = i
+            points[i] = other
+            i += 1
+        point[3] = i
+        points[i] = point
+
+    def toggle(self, axis, sprite, other, overlapping):
+        """Record that sprite and other now do, or don't, overlap on axis."""
+        if sprite is other:
+            return
+        overlaps = self.overlaps[axis]
+        if overlapping:
+            overlaps[sprite].add(other)
+            overlaps[other].add(sprite)
+            if other in self.overlaps[1-axis][sprite]:
+                self.colliding[sprite].add(other)
+                self.colliding[other].add(sprite)
+        else:
+            overlaps[sprite].discard(other)
+            overlaps[other].discard(sprite)
+            self.colliding[sprite].discard(other)
+            self.colliding[other].discard(sprite)
+
+    def collide(self, sprite, other):
+        """True if the rects of two tracked sprites collide."""
+        return other in self.colliding[sprite]
+
+    def get_candidates(self, sprite):
+        """Return the set of tracked sprites colliding with sprite."""
+        return self.colliding[sprite]
+
+    def get_pairs(self):
+        """Return a list of every pair of tracked sprites that collide."""
+        return [(sprite, other) for sprite, others in self.colliding.items()
+                for other in others if id(sprite) < id(other)]
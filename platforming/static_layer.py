@@ -0,0 +1,235 @@
+"""
+The masks of every static obstacle in a level baked into a single mask.
+Testing a sprite against the level is then a single Mask.overlap call, rather
+than a rect test against every block followed by a mask test against each
+block hit.  Per-sprite masks are only needed for objects that move.
+
+Vertical moves (landing, and checking for ground to stand on) are looked up
+in a height field: the runs of solid pixels in every column of the mask.  A
+sprite's MaskProfile holds the bottom and top edges of each of its columns,
+and the first run each edge would reach is a binary search, so the first
+contact anywhere along the move is found, however far the sprite falls, and
+overhangs are handled as the runs of a column needn't be contiguous.  A move
+whose swept rect doesn't overlap the level at all is answered by a single
+overlap test first, so checks in mid air never touch the height field.
+
+Horizontal moves are stepped from where the sprite starts (which must be
+clear) in increments no longer than the thinnest obstacle, so no obstacle
+can be stepped over, and the first blocked step is then bisected.  Solid
+obstacles are assumed; an obstacle with gaps in its mask could still be
+slipped through.  Without continuous collision both axes just bisect
+between the start and the end of the move, which is cheaper but lets fast
+sprites pass through thin obstacles.
+
+Used by fall_mask and fall_rotate.
+"""
+
+import bisect
+
+import pygame as pg
+
+
+def get_runs(mask, x):
+    """
+    Return the (tops, bottoms) of each vertical run of set pixels in column x
+    of mask, from top to bottom.
+    """
+    height = mask.get_size()[1]
+    column = pg.mask.Mask((1, height))
+    column.draw(mask, (-x,0))
+    gaps = column.copy()
+    gaps.invert()
+    ray = pg.mask.Mask((1, height), fill=True)
+    tops, bottoms = [], []
+    hit = column.overlap(ray, (0,0))
+    while hit:
+        gap = gaps.overlap(ray, (0,hit[1]))
+        tops.append(hit[1])
+        bottoms.append(gap[1]-1 if gap else height-1)
+        hit = column.overlap(ray, (0,bottoms[-1]+1))
+    return tops, bottoms
+
+
+class MaskProfile(object):
+    """
+    The bottom and top edges of every column of a sprite's mask; only these
+    can be the first part of a sprite to touch something below or above it.
+    Edges are stored lowest (or highest) first, as those are the most likely
+    to be touching.
+    """
+    def __init__(self, mask):
+        self.below, self.above = [], []
+        for x in range(mask.get_size()[0]):
+            tops, bottoms = get_runs(mask, x)
+            self.below.extend((x, bottom) for bottom in bottoms)
+            self.above.extend((x, top) for top in tops)
+        self.below.sort(key=lambda edge: -edge[1])
+        self.above.sort(key=lambda edge: edge[1])
+
+
+class HeightField(object):
+    """
+    The runs of solid pixels in every column of a mask, so that the distance
+    to the nearest solid pixel above or below a point is a binary search
+    rather than a mask overlap.
+    """
+    def __init__(self, mask):
+        self.mask = mask
+        self.width = mask.get_size()[0]
+        self.columns = [get_runs(mask, x) for x in range(self.width)]
+
+    def rebuild(self, left, right):
+        """Re-read columns left to right (exclusive) from the mask."""
+        for x in range(max(left, 0), min(right, self.width)):
+            self.columns[x] = get_runs(self.mask, x)
+
+
+class StaticLayer(object):
+    """
+    A single mask of a level's static obstacles, with a HeightField of it
+    for vertical moves.
+    """
+    def __init__(self, obstacles):
+        """
+        Obstacles is an iterable of static sprites (with image and rect); it
+        may be empty, in which case nothing ever collides with the layer.
+        """
+        self.obstacles = list(obstacles)
+        rects = [obstacle.rect for obstacle in self.obstacles]
+        self.rect = rects[0].unionall(rects) if rects else pg.Rect(0,0,0,0)
+        self.mask = pg.mask.Mask(self.rect.size)
+        for obstacle in self.obstacles:
+            mask = pg.mask.from_surface(obstacle.image)
+            self.mask.draw(mask, self.get_offset(obstacle.rect))
+        self.heights = HeightField(self.mask)
+        self.thinnest = self.get_thinnest()
+        self.swept = {}
+
+    def get_thinnest(self):
+        """The smallest width and height of any obstacle."""
+        if not self.obstacles:
+            return (1, 1)
+        return (min(obstacle.rect.width for obstacle in self.obstacles),
+                min(obstacle.rect.height for obstacle in self.obstacles))
+
+    def invalidate(self, rect):
+        """
+        Call after changing self.obstacles within rect, which must lie within
+        the layer's rect.  The mask is redrawn inside rect from the obstacles
+        that overlap it, and the height field is rebuilt only in the columns
+        rect covers.
+        """
+        rect = rect.clip(self.rect)
+        offset = self.get_offset(rect)
+        self.mask.erase(pg.mask.Mask(rect.size, fill=True), offset)
+        clip = pg.mask.Mask(rect.size)
+        for obstacle in self.obstacles:
+            if obstacle.rect.colliderect(rect):
+                mask = pg.mask.from_surface(obstacle.image)
+                clip.draw(mask, (obstacle.rect.x-rect.x,
+                                 obstacle.rect.y-rect.y))
+        self.mask.draw(clip, offset)
+        self.heights.rebuild(offset[0], offset[0]+rect.width)
+        self.thinnest = self.get_thinnest()
+
+    def get_offset(self, rect):
+        """Offset of rect's topleft relative to the layer's mask."""
+        return (rect.x-self.rect.x, rect.y-self.rect.y)
+
+    def collide(self, sprite):
+        """Return the point of overlap with the sprite's mask, or None."""
+        return self.mask.overlap(sprite.mask, self.get_offset(sprite.rect))
+
+    def sweep_is_clear(self, rect, distance, index):
+        """
+        Return True if the rect swept distance along index touches nothing.
+        The filled masks used are kept by size, as moves repeat.
+        """
+        swept = rect.copy()
+        swept[index+2] += abs(distance)
+        if distance < 0:
+            swept[index] += distance
+        size = swept.size
+        if size not in self.swept:
+            self.swept[size] = pg.mask.Mask(size, fill=True)
+        offset = self.get_offset(swept)
+        return not self.mask.overlap(self.swept[size], offset)
+
+    def get_clearance(self, sprite, distance, index=1, continuous=True):
+        """
+        Return how far sprite can move along index (0 for x, 1 for y), up to
+        distance (negative for left or up), before touching the layer; zero
+        if it is already touching.  If continuous is true the first contact
+        anywhere along the move is found; vertical moves then need the sprite
+        to have a profile (a MaskProfile of its mask).  Otherwise only the
+        end of the move is tested, so thin obstacles can be passed through.
+        The sprite must not already overlap the layer, and is not moved.
+        """
+        if not distance or self.sweep_is_clear(sprite.rect, distance, index):
+            return distance
+        if not continuous:
+            return self.bisect_clearance(sprite, distance, index, distance)
+        if index == 1:
+            return self.get_height_clearance(sprite, distance)
+        step = self.thinnest[index]
+        return self.bisect_clearance(sprite, distance, index, step)
+
+    def bisect_clearance(self, sprite, distance, index, step):
+        """
+        Test positions along the move at most step apart until one overlaps
+        the layer, then bisect between it and the last clear one.  With a
+        step no longer than the thinnest obstacle every position past the
+        first blocked one is blocked too, so this is exactly where backing
+        out a pixel at a time would stop.
+        """
+        offset = list(self.get_offset(sprite.rect))
+        start = offset[index]
+        step = abs(step) if distance > 0 else -abs(step)
+        clear = 0
+        while clear != distance:
+            blocked = clear+step
+            if abs(blocked) > abs(distance):
+                blocked = distance
+            offset[index] = start+blocked
+            if self.mask.overlap(sprite.mask, offset):
+                break
+            clear = blocked
+        else:
+            return distance
+        while abs(blocked-clear) > 1:
+            middle = (clear+blocked)//2
+            offset[index] = start+middle
+            if self.mask.overlap(sprite.mask, offset):
+                blocked = middle
+            else:
+                clear = middle
+        return clear
+
+    def get_height_clearance(self, sprite, distance):
+        """
+        Find the first contact along a vertical move from the height field.
+        Each edge of the sprite's profile looks up the first run of its
+        column it would reach; the nearest of these limits the move.
+        """
+        x, y = self.get_offset(sprite.rect)
+        columns = self.heights.columns
+        width = self.heights.width
+        if distance > 0:
+            for column, bottom in sprite.profile.below:
+                if 0 <= x+column < width:
+                    tops, bottoms = columns[x+column]
+                    i = bisect.bisect_right(bottoms, y+bottom)
+                    if i < len(tops) and tops[i]-y-bottom-1 < distance:
+                        distance = max(tops[i]-y-bottom-1, 0)
+                        if not distance:
+                            break
+        else:
+            for column, top in sprite.profile.above:
+                if 0 <= x+column < width:
+                    tops, bottoms = columns[x+column]
+                    i = bisect.bisect_left(tops, y+top)-1
+                    if i >= 0 and y+top-1-bottoms[i] < -distance:
+                        distance = -max(y+top-1-bottoms[i], 0)
+                        if not distance:
+                            break
+        return distance
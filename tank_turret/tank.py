@@ -11,6 +11,10 @@ import sys
 import math
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+
 
 CAPTION = "Tank Turret: Keyboard"
 SCREEN_SIZE = (500, 500)
@@ -113,6 +117,7 @@ class Control(object):
         self.screen_rect = self.screen.get_rect()
         self.done = False
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.keys = pg.key.get_pressed()
         self.cannon = Turret((250,250))
@@ -138,19 +143,30 @@ class Control(object):
         self.objects.draw(self.screen)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """"Same old story."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.flip()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 if __name__ == "__main__":
@@ -13,6 +13,10 @@ import sys
 import math
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+
 
 CAPTION = "Tank Turret: Gamepad"
 SCREEN_SIZE = (500, 500)
@@ -109,6 +113,7 @@ class Control(object):
         self.joys = initialize_all_gamepads()
         self.done = False
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60
         self.keys = pg.key.get_pressed()
         self.cannon = Turret(self.joys[0], (250,250))
@@ -133,19 +138,30 @@ class Control(object):
         self.objects.draw(self.screen)
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def main_loop(self):
         """"Same old story."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
+            self.profiler.mark("update")
             self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.flip()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def initialize_all_gamepads():
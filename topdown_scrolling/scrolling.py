@@ -13,6 +13,10 @@ import os
 import sys
 import pygame as pg
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+from common.frame_profiler import FrameProfiler
+
 
 CAPTION = "Scrolling Background"
 SCREEN_SIZE = (500, 500)
@@ -133,6 +137,7 @@ class Control(object):
         self.screen = pg.display.get_surface()
         self.screen_rect = self.screen.get_rect()
         self.clock = pg.time.Clock()
+        self.profiler = FrameProfiler()
         self.fps = 60.0
         self.keys = pg.key.get_pressed()
         self.done = False
@@ -147,8 +152,10 @@ class Control(object):
                 self.done = True
 
     def display_fps(self):
-        """Show the program's FPS in the window handle."""
-        caption = "{} - FPS: {:.2f}".format(CAPTION, self.clock.get_fps())
+        """Show the program's FPS and frame times in the window handle."""
+        template = "{} - FPS: {:.2f} - {}"
+        caption = template.format(CAPTION, self.clock.get_fps(),
+                                  self.profiler.get_summary())
         pg.display.set_caption(caption)
 
     def update(self):
@@ -156,18 +163,31 @@ class Control(object):
         Update the level. In this implementation player updating is taken
         care of by the level update function.
         """
-        self.screen.fill(pg.Color("black"))
         self.level.update(self.keys)
+
+    def draw(self):
+        """Draw the level (and the player within it) to the screen."""
+        self.screen.fill(pg.Color("black"))
         self.level.draw(self.screen)
 
     def main_loop(self):
         """...and we run in circles."""
         while not self.done:
+            self.profiler.start_frame()
             self.event_loop()
+            self.profiler.mark("events")
             self.update()
+            self.profiler.mark("update")
+            self.draw()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.mark("draw")
             pg.display.update()
+            self.profiler.mark("display")
             self.clock.tick(self.fps)
-            self.display_fps()
+            self.profiler.mark("tick")
+            if self.profiler.end_frame():
+                self.display_fps()
+        self.profiler.close()
 
 
 def main():